@@ -0,0 +1,284 @@
+# api_server.py
+import argparse
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import resources
+import tracing
+from batch_generator import generate
+from config import (
+    INSURANCE_TYPES, REGIONS, LINES_OF_BUSINESS, MAX_TEST_CASES,
+    API_MAX_CONCURRENCY, API_TENANT_CONCURRENCY, API_MAX_PENDING, API_TENANT_MAX_PENDING, API_JOB_RETENTION,
+)
+from file_formatters import format_test_cases_for_txt, format_test_cases_for_docx_bytes, format_test_cases_for_excel
+from response_parser import format_diagnostic
+
+EXPORTS = {
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", format_test_cases_for_excel),
+    "txt": ("text/plain", format_test_cases_for_txt),
+    "docx": (
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document", format_test_cases_for_docx_bytes,
+    ),
+}
+
+
+class QueueFull(Exception):
+    """Raised when accepting a job would exceed the queue limits."""
+
+
+class JobManager:
+    """Queues generation jobs with global and per-tenant limits.
+
+    Each job waits for a slot in its tenant's semaphore first and only then
+    for a global slot, so one busy tenant cannot hold global slots while its
+    own backlog drains. Submissions beyond `max_pending` jobs in total, or
+    `tenant_max_pending` for one tenant, are rejected instead of queued.
+    A tenant's counters and semaphore are dropped once it has no jobs in
+    flight, so arbitrary X-Tenant values do not pile up.
+    """
+
+    def __init__(self, max_concurrency=API_MAX_CONCURRENCY, tenant_concurrency=API_TENANT_CONCURRENCY,
+                 max_pending=API_MAX_PENDING, tenant_max_pending=API_TENANT_MAX_PENDING,
+                 retention=API_JOB_RETENTION, run=generate):
+        self.tenant_concurrency = tenant_concurrency
+        self.max_pending = max_pending
+        self.tenant_max_pending = tenant_max_pending
+        self.retention = retention
+        self.run = run
+        self.jobs = OrderedDict()
+        self._global_slots = asyncio.Semaphore(max_concurrency)
+        self._tenant_slots = {}
+        self._active = {}
+        self._tasks = set()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def submit(self, tenant, params):
+        """Accept a job and start it in the background; returns the job dict"""
+        active = sum(self._active.values())
+        if active >= self.max_pending:
+            raise QueueFull("Server is at capacity, retry later")
+        if self._active.get(tenant, 0) >= self.tenant_max_pending:
+            raise QueueFull(f"Tenant {tenant} has too many jobs in flight, retry later")
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "tenant": tenant,
+            "status": "queued",
+            "params": params,
+            "submitted_at": time.time(),
+            "test_cases": None,
+            "diagnostics": [],
+            "error": None,
+            "trace": None,
+        }
+        self.jobs[job["id"]] = job
+        self._active[tenant] = self._active.get(tenant, 0) + 1
+        # Hold a reference so the task is not garbage collected while it runs
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._evict_finished()
+        return job
+
+    async def _run(self, job):
+        tenant_slots = self._tenant_slots.setdefault(job["tenant"], asyncio.Semaphore(self.tenant_concurrency))
+        try:
+            async with tenant_slots, self._global_slots:
+                job["status"] = "running"
+                job["started_at"] = time.time()
+                (test_cases, _, diagnostics), job["trace"] = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._generate, job["params"],
+                )
+            job["test_cases"] = test_cases
+            job["diagnostics"] = [format_diagnostic(diagnostic) for diagnostic in diagnostics]
+            job["status"] = "done"
+        except Exception as e:
+            job["error"] = str(e)
+            job["status"] = "failed"
+        finally:
+            job["finished_at"] = time.time()
+            self._active[job["tenant"]] -= 1
+            if not self._active[job["tenant"]]:
+                # No job of this tenant is queued or running, so nothing holds or awaits its semaphore
+                del self._active[job["tenant"]]
+                del self._tenant_slots[job["tenant"]]
+
+    def _generate(self, params):
+        """Run one generation on a worker thread; returns (result, trace summary)"""
+        previous = tracing.last_trace()
+        result = self.run(params["insurance_type"], params["region"], params["line_of_business"],
+                          params["requirements"], params["num_test_cases"])
+        finished = tracing.last_trace()
+        return result, finished.to_dict() if finished is not previous else None
+
+    def _evict_finished(self):
+        """Forget the oldest finished jobs beyond the retention limit"""
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.retention)]:
+            del self.jobs[job_id]
+
+    def stats(self):
+        return {
+            "queued": sum(job["status"] == "queued" for job in self.jobs.values()),
+            "running": sum(job["status"] == "running" for job in self.jobs.values()),
+            "tenants": dict(self._active),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _job_view(job):
+    view = {key: job[key] for key in ("id", "tenant", "status", "error", "diagnostics", "trace")}
+    if job["test_cases"] is not None:
+        view["test_cases"] = [dict(case.to_dict(), Novelty=case.novelty) for case in job["test_cases"]]
+    return view
+
+
+def _validate(body):
+    """Return generation parameters from a request body, or raise HTTPBadRequest"""
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="Body must be a JSON object")
+    try:
+        params = {
+            "insurance_type": body.get("insurance_type", INSURANCE_TYPES[0]),
+            "region": body.get("region", REGIONS[0]),
+            "line_of_business": body.get("line_of_business", LINES_OF_BUSINESS[0]),
+            "requirements": str(body["requirements"]),
+            "num_test_cases": int(body.get("num_test_cases", 5)),
+        }
+    except (KeyError, TypeError, ValueError):
+        raise web.HTTPBadRequest(text="Body must be JSON with 'requirements' and an integer 'num_test_cases'")
+    for field, allowed in (("insurance_type", INSURANCE_TYPES), ("region", REGIONS),
+                           ("line_of_business", LINES_OF_BUSINESS)):
+        if params[field] not in allowed:
+            raise web.HTTPBadRequest(text=f"'{field}' must be one of {', '.join(allowed)}")
+    if not params["requirements"].strip():
+        raise web.HTTPBadRequest(text="'requirements' must not be empty")
+    if not 1 <= params["num_test_cases"] <= MAX_TEST_CASES:
+        raise web.HTTPBadRequest(text=f"'num_test_cases' must be between 1 and {MAX_TEST_CASES}")
+    return params
+
+
+async def submit_job(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Body must be JSON")
+    params = _validate(body)
+    tenant = request.headers.get("X-Tenant", "default")
+    try:
+        job = request.app["jobs"].submit(tenant, params)
+    except QueueFull as e:
+        return web.json_response({"error": str(e)}, status=429, headers={"Retry-After": "5"})
+    return web.json_response({"id": job["id"], "status": job["status"]}, status=202)
+
+
+def _get_job(request):
+    job = request.app["jobs"].jobs.get(request.match_info["job_id"])
+    if job is None:
+        raise web.HTTPNotFound(text="Unknown job")
+    return job
+
+
+async def get_job(request):
+    return web.json_response(_job_view(_get_job(request)))
+
+
+async def export_job(request):
+    job = _get_job(request)
+    export_format = request.query.get("format", "xlsx")
+    if export_format not in EXPORTS:
+        raise web.HTTPBadRequest(text=f"format must be one of {', '.join(EXPORTS)}")
+    if job["status"] != "done":
+        raise web.HTTPConflict(text=f"Job is {job['status']}")
+    content_type, build = EXPORTS[export_format]
+
+    def export():
+        with tracing.trace("export", format=export_format, cases=len(job["test_cases"])):
+            return build(job["test_cases"])
+
+    # Formatting can be slow for large suites, so keep it off the event loop
+    data = await asyncio.get_running_loop().run_in_executor(None, export)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return web.Response(body=data, content_type=content_type, headers={
+        "Content-Disposition": f'attachment; filename="test_cases_{job["id"]}.{export_format}"',
+    })
+
+
+async def accept_job(request):
+    """Append a finished job's test cases to the test bank; indexed on the next create_embeddings.py run"""
+    job = _get_job(request)
+    if job["status"] != "done":
+        raise web.HTTPConflict(text=f"Job is {job['status']}")
+    if job.get("accepted"):
+        return web.json_response({"id": job["id"], "added": 0})
+    if job.get("accepting"):
+        raise web.HTTPConflict(text="Job is being added to the test bank")
+    params = job["params"]
+    # Marked accepted only once stored, so a failed append can be retried
+    job["accepting"] = True
+    try:
+        added = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: resources.get_test_bank().append_cases(
+                job["test_cases"], params["insurance_type"], params["region"], params["line_of_business"],
+            ),
+        )
+    finally:
+        job["accepting"] = False
+    job["accepted"] = True
+    return web.json_response({"id": job["id"], "added": added})
+
+
+async def health(request):
+    status = resources.health_check()
+    status["jobs"] = request.app["jobs"].stats()
+    return web.json_response(status, status=200 if status["healthy"] else 503)
+
+
+async def metrics(request):
+    if tracing.prometheus is None:
+        raise web.HTTPNotFound(text="Prometheus metrics are disabled (TRACE_SINKS)")
+    return web.Response(text=tracing.prometheus.render(), content_type="text/plain")
+
+
+async def _startup(app):
+    # Load the embedding model and vector store once, before taking traffic
+    await asyncio.get_running_loop().run_in_executor(None, resources.warmup)
+    app["jobs"] = JobManager()
+
+
+async def _cleanup(app):
+    app["jobs"].shutdown()
+    resources.teardown()
+
+
+def create_app():
+    app = web.Application()
+    app.router.add_post("/jobs", submit_job)
+    app.router.add_get("/jobs/{job_id}", get_job)
+    app.router.add_get("/jobs/{job_id}/export", export_job)
+    app.router.add_post("/jobs/{job_id}/accept", accept_job)
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics)
+    app.on_startup.append(_startup)
+    app.on_cleanup.append(_cleanup)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API for queued test case generation.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,81 @@
 # app.py
 import streamlit as st
-from docx import Document
-from test_case_generator import generate_test_cases
-from file_formatters import format_test_cases_for_txt, format_test_cases_for_docx, format_test_cases_for_excel
-from io import BytesIO
-import pandas as pd
+import requirement_files
+from test_case_generator import generate_test_cases, generate_test_cases_stream
+from generation_scheduler import generate_test_cases_by_criteria, generate_test_cases_sharded, uses_criteria
+from config import SHARD_SIZE, MAX_TEST_CASES, INSURANCE_TYPES, REGIONS, LINES_OF_BUSINESS, METRICS_PORT
+from file_formatters import (
+    format_test_cases_for_txt, format_test_cases_for_docx_bytes, format_test_cases_for_excel, test_cases_fingerprint,
+)
+import resources
+import tracing
+from models import COLUMNS, cases_to_dataframe
+
+DISPLAY_COLUMNS = [column for column in COLUMNS if column not in ("LOB", "Region")]
+
+# Load the embedding model, vector store and LLM client once per server process
+resources.warmup()
+if METRICS_PORT:
+    tracing.serve_metrics(METRICS_PORT)
+
+def render_test_case_table(test_cases):
+    """Render test cases as an HTML table (without LOB and Region)"""
+    df_display = cases_to_dataframe(test_cases, DISPLAY_COLUMNS)
+    
+    # Show each execution step on its own line
+    df_display['Execution Steps'] = df_display['Execution Steps'].str.replace('\n', '<br>')
+    if any(case.novelty is not None for case in test_cases):
+        # 1 = unlike anything seen, 0 = near-copy of another case or the test bank
+        df_display['Novelty'] = [case.novelty for case in test_cases]
+    html_table = df_display.to_html(index=False, escape=False)
+    
+    return f"""
+    <div style='overflow-x: auto; margin: 20px 0;'>
+        {html_table}
+    </div>
+    """
+
+def current_exports():
+    """Prepared exports for the current test cases, dropped as soon as the cases change"""
+    fingerprint = st.session_state.test_cases_hash
+    if st.session_state.get("exports_hash") != fingerprint:
+        st.session_state.exports = {}
+        st.session_state.exports_hash = fingerprint
+    return st.session_state.exports
+
+def export_download(export_format, label, file_name, mime, build):
+    """Offer a download that is only generated when the user asks for it"""
+    exports = current_exports()
+    if export_format not in exports and st.button(f"Prepare {label}", key=f"prepare_{export_format}"):
+        with st.spinner(f"Preparing {label}..."), tracing.trace("export", format=export_format):
+            exports[export_format] = build()
+    if export_format in exports:
+        st.download_button(f"📥 Download {label}", exports[export_format], file_name, mime,
+                           key=f"download_{export_format}")
+
+def render_trace_panel(trace, raw_response):
+    """Stage timings, token counts and the raw response of the last generation"""
+    with st.expander("Request trace"):
+        if trace is None:
+            st.caption("No trace was recorded for this run")
+        else:
+            total, tokens, parsed, failed = st.columns(4)
+            total.metric("Total", f"{trace.duration:.2f} s")
+            tokens.metric("Tokens in / out",
+                          f"{trace.counters.get('tokens_in', 0)} / {trace.counters.get('tokens_out', 0)}")
+            parsed.metric("Cases parsed", trace.counters.get("cases_parsed", 0))
+            failed.metric("Parse failures", trace.counters.get("cases_failed", 0))
+            st.dataframe([span.to_dict() for span in trace.spans], use_container_width=True)
+        st.code(raw_response)
 
 # Streamlit UI
 st.markdown("<h1 style='text-align: center;'>XC AI Test Case Generator</h1>", unsafe_allow_html=True)
 
 with st.sidebar:
     st.header("Configuration")
-    insurance_type = st.selectbox("Insurance Type", ["Auto", "Health", "Home", "Life"])
-    region = st.selectbox("Region", ["North America", "Europe", "Asia Pacific", "ANZ"])
-    line_of_business = st.selectbox("Line of Business", ["Retail", "Commercial", "Enterprise"])
+    insurance_type = st.selectbox("Insurance Type", INSURANCE_TYPES)
+    region = st.selectbox("Region", REGIONS)
+    line_of_business = st.selectbox("Line of Business", LINES_OF_BUSINESS)
     
     st.subheader("Acceptance Criteria")
     
@@ -44,24 +106,27 @@ with st.sidebar:
     else:
         st.session_state.manual_input_used = False
     
-    # Extract text from file or use manual input
+    # Extract text from file or use manual input; each upload is parsed once, not on every rerun
     def extract_text(file):
         if not file: return ""
         try:
-            if file.type == "text/plain":
-                return file.getvalue().decode()
-            elif file.type == "text/csv":
-                return pd.read_csv(file).to_string()
-            elif file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-                return "\n".join([p.text for p in Document(file).paragraphs])
+            parsed = requirement_files.parse_requirements(file)
         except Exception as e:
             st.error(f"File error: {e}")
             return ""
+        st.caption(f"{len(parsed['criteria'])} acceptance criteria found")
+        return parsed["text"]
     
     requirements = extract_text(criteria_file) or manual_input
 
     # Add input for number of test cases
-    num_test_cases = st.number_input("Number of Test Cases", min_value=1, max_value=20, value=5)
+    num_test_cases = st.number_input("Number of Test Cases", min_value=1, max_value=MAX_TEST_CASES, value=5)
+
+    # Show each test case as soon as it has been generated
+    stream_results = st.checkbox("Stream results", value=True)
+
+    # Per-stage timings of the last generation, with the raw model response
+    show_trace = st.checkbox("Show request trace")
 
 # Main interface
 if st.button("✨ Generate Test Cases"):
@@ -70,8 +135,42 @@ if st.button("✨ Generate Test Cases"):
     else:
         try:
             with st.spinner("Generating test cases..."):
-                generated = generate_test_cases(insurance_type, region, line_of_business, requirements, num_test_cases)
+                if uses_criteria(requirements):
+                    # Long requirement documents are generated per acceptance criterion and merged
+                    table_placeholder = st.empty()
+                    generated = generate_test_cases_by_criteria(
+                        insurance_type, region, line_of_business, requirements, num_test_cases,
+                        on_progress=lambda cases: table_placeholder.markdown(render_test_case_table(cases),
+                                                                             unsafe_allow_html=True),
+                    )
+                    table_placeholder.empty()
+                elif num_test_cases > SHARD_SIZE:
+                    # Large suites are generated as parallel shards and merged
+                    table_placeholder = st.empty()
+                    generated = generate_test_cases_sharded(
+                        insurance_type, region, line_of_business, requirements, num_test_cases,
+                        on_progress=lambda cases: table_placeholder.markdown(render_test_case_table(cases),
+                                                                             unsafe_allow_html=True),
+                    )
+                    table_placeholder.empty()
+                elif stream_results:
+                    generated = []
+                    table_placeholder = st.empty()
+                    for case in generate_test_cases_stream(insurance_type, region, line_of_business, requirements,
+                                                           num_test_cases):
+                        generated.append(case)
+                        table_placeholder.markdown(render_test_case_table(generated), unsafe_allow_html=True)
+                    # The full table is rendered again with the results below
+                    table_placeholder.empty()
+                else:
+                    generated = generate_test_cases(insurance_type, region, line_of_business, requirements,
+                                                    num_test_cases)
                 st.session_state.test_cases = generated
+                # Selections the cases were generated for, since the sidebar may change before they are banked
+                st.session_state.generation_params = (insurance_type, region, line_of_business)
+                st.session_state.trace = tracing.last_trace()
+                # Prepared exports are keyed to this hash and rebuilt when it changes
+                st.session_state.test_cases_hash = test_cases_fingerprint(generated)
                 st.success(f"Generated {len(generated)} test cases!")
         except Exception as e:
             st.error(f"Generation failed: {str(e)}")
@@ -82,60 +181,37 @@ st.divider()
 if 'test_cases' in st.session_state:
     st.subheader("Generated Test Cases")
     
-    # Debug view
-    with st.expander("Debug Raw Response"):
-        st.code(st.session_state.raw_response)
+    if show_trace:
+        render_trace_panel(st.session_state.get("trace"), st.session_state.raw_response)
     
     # Main table display
     if st.session_state.test_cases:
-        df = pd.DataFrame(st.session_state.test_cases)
-        
-        # Remove LOB and Region columns
-        df_display = df.drop(columns=["LOB", "Region"])
-        
-        # Format steps with line breaks
-        df_display['Execution Steps'] = df_display['Execution Steps'].str.replace(r'(Step\d+:)', r'\n\1', regex=True)
-        
-        # Fix: Use raw string for the HTML replacement
-        html_table = df_display.to_html(index=False, escape=False)
-        html_table = html_table.replace(r'\n', '<br>')
-        
-        st.markdown(f"""
-        <div style='overflow-x: auto; margin: 20px 0;'>
-            {html_table}
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(render_test_case_table(st.session_state.test_cases), unsafe_allow_html=True)
         
-        # Excel export (without LOB and Region)
-        excel_buffer = BytesIO()
-        excel_content = format_test_cases_for_excel(st.session_state.test_cases)
-        st.download_button(
-            "📥 Download Excel",
-            excel_content,
-            "test_cases.xlsx",
-            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        # Exports (without LOB and Region) are built lazily, only when requested
+        test_cases = st.session_state.test_cases
+        per_module = st.checkbox("One Excel sheet per module")
+        sheet_by = "module" if per_module else None
+        export_download(
+            f"xlsx:{sheet_by}", "Excel", "test_cases.xlsx",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            lambda: format_test_cases_for_excel(test_cases, sheet_by=sheet_by),
         )
-        
-        # TXT export (without LOB and Region)
-        txt_content = format_test_cases_for_txt(st.session_state.test_cases)
-        st.download_button(
-            "📥 Download as TXT",
-            txt_content,
-            "test_cases.txt",
-            "text/plain"
-        )
-        
-        # Word (DOCX) export (without LOB and Region)
-        doc = format_test_cases_for_docx(st.session_state.test_cases)
-        doc_buffer = BytesIO()
-        doc.save(doc_buffer)
-        doc_buffer.seek(0)
-        st.download_button(
-            "📥 Download as Word (DOCX)",
-            doc_buffer.getvalue(),
-            "test_cases.docx",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        export_download("txt", "TXT", "test_cases.txt", "text/plain",
+                        lambda: format_test_cases_for_txt(test_cases))
+        export_download(
+            "docx", "Word (DOCX)", "test_cases.docx",
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            lambda: format_test_cases_for_docx_bytes(test_cases),
         )
+
+        # Accepted cases join the test bank; they are embedded on the next create_embeddings.py run
+        if st.session_state.get("banked_hash") == st.session_state.test_cases_hash:
+            st.caption("These test cases are in the test bank")
+        elif st.button("➕ Add to test bank"):
+            added = resources.get_test_bank().append_cases(test_cases, *st.session_state.generation_params)
+            st.session_state.banked_hash = st.session_state.test_cases_hash
+            st.success(f"Added {added} test cases to the test bank; run create_embeddings.py to index them")
     else:
         st.warning("No valid test cases could be parsed from the response")
 
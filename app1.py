@@ -1,27 +1,18 @@
-import os
 import pandas as pd
-from dotenv import load_dotenv
-from groq import Groq
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
+import resources
 import streamlit as st
+from file_formatters import format_test_cases_for_excel
+from models import TestCase
 from docx import Document
 from io import BytesIO
 import re
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Font, PatternFill
-from openpyxl.utils.dataframe import dataframe_to_rows
 
-# Load environment variables
-load_dotenv()
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-
-groq_client = Groq(api_key=GROQ_API_KEY)
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+# Shared per-process resources, so reruns do not reload the model or reopen Chroma
+groq_client = resources.get_groq_client()
 
 # Load Chroma DB
 try:
-    vector_db = Chroma(persist_directory="./chroma_db", embedding_function=embeddings)
+    vector_db = resources.get_vector_db()
 except Exception as e:
     st.error(f"Error loading Chroma DB: {e}")
     st.stop()
@@ -287,29 +278,11 @@ if 'test_cases' in st.session_state:
         """, unsafe_allow_html=True)
         
         # Excel export (without LOB and Region)
-        excel_buffer = BytesIO()
-        with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-            df_display.to_excel(writer, index=False)
-            worksheet = writer.sheets['Sheet1']
-            
-            # Format columns
-            for col in worksheet.columns:
-                max_length = max(len(str(cell.value)) for cell in col)
-                worksheet.column_dimensions[col[0].column_letter].width = max_length + 2
-            
-            # Highlight the header row in yellow
-            yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-            for cell in worksheet[1]:  # Header row (first row)
-                cell.fill = yellow_fill
-            
-            # Format steps
-            for row in worksheet.iter_rows(min_row=2):
-                cell = row[5]  # Execution Steps column (adjusted index after removing columns)
-                cell.alignment = Alignment(wrap_text=True, vertical='top')
+        excel_content = format_test_cases_for_excel([TestCase.from_dict(case) for case in st.session_state.test_cases])
 
         st.download_button(
             "📥 Download Excel",
-            excel_buffer.getvalue(),
+            excel_content,
             "test_cases.xlsx",
             "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
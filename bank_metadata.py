@@ -0,0 +1,120 @@
+# bank_metadata.py
+import functools
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+from config import INGEST_MANIFEST_PATH
+
+# Region spellings found in test banks -> the region names offered in the UI
+REGION_ALIASES = {
+    "us": "North America", "usa": "North America", "na": "North America", "canada": "North America",
+    "north america": "North America",
+    "eu": "Europe", "uk": "Europe", "emea": "Europe", "europe": "Europe",
+    "asia": "Asia Pacific", "apac": "Asia Pacific", "asia pacific": "Asia Pacific",
+    "anz": "ANZ", "aus": "ANZ", "australia": "ANZ", "nz": "ANZ", "new zealand": "ANZ",
+}
+INSURANCE_SUFFIX = re.compile(r"\s+insurance$", re.IGNORECASE)
+
+
+def normalize_insurance_type(value):
+    """"Auto Insurance" -> "Auto", so bank rows match the insurance types offered in the UI"""
+    return INSURANCE_SUFFIX.sub("", " ".join(str(value).split())).title()
+
+
+def normalize_region(value):
+    value = " ".join(str(value).split())
+    return REGION_ALIASES.get(value.lower(), value)
+
+
+def normalize_label(value):
+    return " ".join(str(value).split()).title()
+
+
+# Metadata field -> (test bank column, normalizer). The bank's "LOB" column
+# holds the insurance type ("Auto Insurance"); a "Line of Business" column,
+# when a bank has one, holds the Retail/Commercial/Enterprise split.
+METADATA_COLUMNS = {
+    "insurance_type": ("LOB", normalize_insurance_type),
+    "region": ("Region", normalize_region),
+    "line_of_business": ("Line of Business", normalize_label),
+    "module": ("Module", normalize_label),
+}
+
+
+def row_metadata(rows):
+    """Normalized metadata fields per row, for the columns this bank has (missing values become "")"""
+    metadata = pd.DataFrame(index=rows.index)
+    for field, (column, normalize) in METADATA_COLUMNS.items():
+        if column in rows.columns:
+            values = rows[column].fillna("").astype(str)
+            # Normalize each distinct value once rather than every row
+            normalized = {value: normalize(value) if value.strip() else "" for value in values.unique()}
+            metadata[field] = values.map(normalized)
+    return metadata
+
+
+def build_filter(**fields):
+    """Chroma `where` clause matching every given field, or None when none are given"""
+    conditions = [{field: value} for field, value in fields.items() if value]
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def where_mask(where, fields, count):
+    """Boolean mask of the rows matching a Chroma-style `where` clause (None matches all).
+
+    `fields` maps each metadata field to (integer code per row, {value: code}).
+    """
+    if where is None:
+        return None
+    if "$and" in where:
+        mask = np.ones(count, dtype=bool)
+        for condition in where["$and"]:
+            mask &= where_mask(condition, fields, count)
+        return mask
+    (field, value), = where.items()
+    codes, lookup = fields.get(field, (None, {}))
+    if codes is None or value not in lookup:
+        return np.zeros(count, dtype=bool)
+    return np.asarray(codes) == lookup[value]
+
+
+@functools.lru_cache(maxsize=1)
+def indexed_fields(manifest_path=INGEST_MANIFEST_PATH):
+    """Metadata fields stored by the last ingestion run, or None when unknown.
+
+    Read once per process; restart after re-indexing a bank with new columns.
+    """
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        fields = json.load(f).get("fields")
+    return None if fields is None else frozenset(fields)
+
+
+def filter_cascade(insurance_type, region, line_of_business, fields=None):
+    """Filters to try in turn, strictest first, ending with no filter at all.
+
+    Conditions on fields outside `fields` (when known) are dropped, since
+    they could never match and would only cost an extra search.
+    """
+    def usable(field, value):
+        return value if value and (fields is None or field in fields) else None
+
+    insurance_type = usable("insurance_type", insurance_type and normalize_insurance_type(insurance_type))
+    region = usable("region", region and normalize_region(region))
+    line_of_business = usable("line_of_business", line_of_business and normalize_label(line_of_business))
+    cascade = []
+    for where in (
+        build_filter(insurance_type=insurance_type, region=region, line_of_business=line_of_business),
+        build_filter(insurance_type=insurance_type, region=region),
+        build_filter(insurance_type=insurance_type),
+        None,
+    ):
+        if where not in cascade:
+            cascade.append(where)
+    return cascade
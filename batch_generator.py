@@ -0,0 +1,174 @@
+# batch_generator.py
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import SHARD_SIZE, MAX_TEST_CASES, INSURANCE_TYPES, REGIONS, LINES_OF_BUSINESS
+from file_formatters import format_test_cases_for_txt, format_test_cases_for_docx, write_test_cases_excel
+from generation_scheduler import generate_suite_by_criteria, generate_suite_sharded, uses_criteria
+from requirement_files import extract_text_from_path, find_requirement_files
+from response_parser import format_diagnostic
+from test_case_generator import generate_suite
+import tracing
+
+OUTPUT_FORMATS = ["xlsx", "txt", "docx"]
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+def generate(insurance_type, region, line_of_business, requirements, num_test_cases):
+    """Headless generation: per acceptance criterion for long requirement documents,
+    otherwise one call for small suites and sharded fan-out above SHARD_SIZE.
+
+    Returns (test_cases, raw_response, diagnostics).
+    """
+    if uses_criteria(requirements):
+        return generate_suite_by_criteria(insurance_type, region, line_of_business, requirements, num_test_cases)
+    if num_test_cases > SHARD_SIZE:
+        return generate_suite_sharded(insurance_type, region, line_of_business, requirements, num_test_cases)
+    return generate_suite(insurance_type, region, line_of_business, requirements, num_test_cases)
+
+
+def write_outputs(test_cases, base_path, formats=OUTPUT_FORMATS):
+    """Write test cases next to `base_path` in each requested format; returns the paths"""
+    paths = []
+    if "xlsx" in formats:
+        with tracing.trace("export", format="xlsx", cases=len(test_cases)):
+            write_test_cases_excel(test_cases, base_path + ".xlsx")
+        paths.append(base_path + ".xlsx")
+    if "txt" in formats:
+        with tracing.trace("export", format="txt", cases=len(test_cases)):
+            with open(base_path + ".txt", "w", encoding="utf-8") as f:
+                f.write(format_test_cases_for_txt(test_cases))
+        paths.append(base_path + ".txt")
+    if "docx" in formats:
+        with tracing.trace("export", format="docx", cases=len(test_cases)):
+            format_test_cases_for_docx(test_cases).save(base_path + ".docx")
+        paths.append(base_path + ".docx")
+    return paths
+
+
+def _slug(value):
+    return re.sub(r"[^A-Za-z0-9]+", "-", value).strip("-").lower()
+
+
+class Checkpoint:
+    """Completed jobs recorded in a JSON file so an interrupted run can resume."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.jobs = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.jobs = json.load(f)
+
+    def is_done(self, job):
+        entry = self.jobs.get(job["key"])
+        return bool(entry) and entry.get("fingerprint") == job["fingerprint"]
+
+    def record(self, job, outputs, count):
+        with self._lock:
+            self.jobs[job["key"]] = {"fingerprint": job["fingerprint"], "outputs": outputs, "test_cases": count}
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.jobs, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def plan_jobs(requirements_dir, output_dir, insurance_types, regions, lines_of_business, num_test_cases):
+    """One job per requirement file and insurance type x region x LOB combination"""
+    jobs = []
+    for path in find_requirement_files(requirements_dir):
+        with open(path, "rb") as f:
+            file_hash = hashlib.sha256(f.read()).hexdigest()
+        # The extension stays in keys and output names, so story.txt and story.csv do not collide
+        relative = os.path.relpath(path, requirements_dir)
+        for insurance_type, region, line_of_business in itertools.product(insurance_types, regions, lines_of_business):
+            combination = "_".join(_slug(value) for value in (insurance_type, region, line_of_business))
+            jobs.append({
+                "key": f"{relative}::{combination}",
+                "path": path,
+                "insurance_type": insurance_type,
+                "region": region,
+                "line_of_business": line_of_business,
+                "output_base": os.path.join(output_dir, f"{relative}__{combination}"),
+                # A changed file or case count invalidates the checkpoint entry
+                "fingerprint": f"{file_hash}:{num_test_cases}",
+            })
+    return jobs
+
+
+def run_job(job, num_test_cases, formats):
+    requirements = extract_text_from_path(job["path"])
+    test_cases, _, diagnostics = generate(
+        job["insurance_type"], job["region"], job["line_of_business"], requirements, num_test_cases
+    )
+    for diagnostic in diagnostics:
+        print(f"{job['key']}: {format_diagnostic(diagnostic)}")
+    if not test_cases:
+        raise ValueError("No valid test cases could be parsed from the response")
+    os.makedirs(os.path.dirname(job["output_base"]), exist_ok=True)
+    return write_outputs(test_cases, job["output_base"], formats), len(test_cases)
+
+
+def run_batch(requirements_dir, output_dir, insurance_types=INSURANCE_TYPES, regions=REGIONS,
+              lines_of_business=LINES_OF_BUSINESS, num_test_cases=5, workers=4, formats=OUTPUT_FORMATS):
+    """Generate suites for every requirement file and selection combination.
+
+    Jobs run on a thread pool and each finished job is checkpointed, so
+    re-running the same command skips work that is already done. Returns
+    {"done", "skipped", "failed"} counts.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint = Checkpoint(os.path.join(output_dir, CHECKPOINT_FILE))
+    jobs = plan_jobs(requirements_dir, output_dir, insurance_types, regions, lines_of_business, num_test_cases)
+    pending = [job for job in jobs if not checkpoint.is_done(job)]
+    stats = {"done": 0, "skipped": len(jobs) - len(pending), "failed": 0}
+    print(f"{len(jobs)} jobs, {stats['skipped']} already done")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_job, job, num_test_cases, formats): job for job in pending}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                outputs, count = future.result()
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"{job['key']}: failed: {e}")
+                continue
+            checkpoint.record(job, outputs, count)
+            stats["done"] += 1
+            print(f"{job['key']}: {count} test cases ({stats['done']}/{len(pending)})")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate test case suites for a directory of requirement files.")
+    parser.add_argument("requirements_dir", help="Directory of txt/csv/docx requirement files")
+    parser.add_argument("output_dir", help="Directory for generated suites and the resume checkpoint")
+    parser.add_argument("--insurance-type", nargs="+", default=INSURANCE_TYPES, dest="insurance_types")
+    parser.add_argument("--region", nargs="+", default=REGIONS, dest="regions")
+    parser.add_argument("--lob", nargs="+", default=LINES_OF_BUSINESS, dest="lines_of_business")
+    parser.add_argument("--num-test-cases", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4, help="Jobs generated concurrently")
+    parser.add_argument("--formats", nargs="+", choices=OUTPUT_FORMATS, default=OUTPUT_FORMATS)
+    args = parser.parse_args()
+
+    if not 1 <= args.num_test_cases <= MAX_TEST_CASES:
+        parser.error(f"--num-test-cases must be between 1 and {MAX_TEST_CASES}")
+    stats = run_batch(
+        args.requirements_dir, args.output_dir, args.insurance_types, args.regions, args.lines_of_business,
+        args.num_test_cases, args.workers, args.formats,
+    )
+    print(f"Done: {stats['done']} generated, {stats['skipped']} skipped, {stats['failed']} failed")
+    if stats["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# benchmark.py
+import argparse
+import contextlib
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    TEST_BANK_PATH, EMBEDDING_MODEL_NAME, MAX_TEST_CASES,
+    INSURANCE_TYPES, REGIONS, LINES_OF_BUSINESS,
+)
+from embedding_engine import embed_and_store
+from file_formatters import format_test_cases_for_txt, format_test_cases_for_docx_bytes, format_test_cases_for_excel
+from ingestion import chunk_metadata, iter_chunks
+from llm_backend import StubBackend
+from models import COLUMNS, dataframe_to_cases
+from resources import get_embedding_model
+from retriever import HybridRetriever
+from vector_index import MmapVectorStore, build_vector_index
+from response_parser import clean_ai_response, parse_response
+from test_case_generator import build_prompt
+
+BENCH_DIR = "./cache/bench"
+BASELINE_PATH = "benchmark_baseline.json"
+SCALES = [1_000, 100_000, 1_000_000]
+STAGES = [
+    "embedding_load", "index_build", "similarity_search", "mmap_search", "hybrid_search", "prompt_assembly",
+    "clean_ai_response", "parse_response", "format_txt", "format_excel", "format_docx",
+]
+# Exports are built from the first rows of each bank; Word tables get slow long before the others
+EXPORT_LIMITS = {"format_txt": 100_000, "format_excel": 100_000, "format_docx": 2_000}
+QUERIES = [
+    "Policy renewal must recalculate the premium when the driver's history changes",
+    "Claims above the approval limit are routed to a senior adjuster",
+    "Customers receive an email confirmation after a successful payment",
+    "Underwriting rejects applications with missing identity documents",
+]
+
+
+def synthetic_bank(rows, source=TEST_BANK_PATH, seed=0):
+    """A test bank of `rows` rows resampled from `source`, with unique ids and descriptions."""
+    base = pd.read_csv(source, usecols=lambda column: column in COLUMNS)
+    rng = np.random.default_rng(seed)
+    bank = base.iloc[rng.integers(0, len(base), rows)].reset_index(drop=True)
+    number = pd.Series(np.arange(1, rows + 1)).astype(str)
+    bank["Sl No."] = number
+    bank["Test Case ID"] = "TC_" + number
+    bank["Requirement ID"] = "REQ_" + pd.Series(rng.integers(1, max(2, rows // 10), rows)).astype(str)
+    bank["LOB"] = rng.choice(base["LOB"].dropna().unique(), rows)
+    bank["Region"] = rng.choice(base["Region"].dropna().unique(), rows)
+    # Distinct text so chunks do not collapse onto the same embedding
+    bank["Test Case Description"] = bank["Test Case Description"].fillna("") + " (variant " + number + ")"
+    return bank
+
+
+def bank_path(rows):
+    """Path of the synthetic bank with `rows` rows, written on first use."""
+    path = os.path.join(BENCH_DIR, f"bank_{rows}.csv")
+    if not os.path.exists(path):
+        os.makedirs(BENCH_DIR, exist_ok=True)
+        synthetic_bank(rows).to_csv(path, index=False)
+    return path
+
+
+def bench_index(rows):
+    """Chroma index of the synthetic bank, built once per scale; returns (vector_db, build_seconds, chunks)."""
+    from langchain_chroma import Chroma
+
+    vector_db = Chroma(
+        collection_name=f"bench_{rows}",
+        persist_directory=os.path.join(BENCH_DIR, "chroma"),
+        embedding_function=get_embedding_model(),
+    )
+    marker = os.path.join(BENCH_DIR, f"chroma_{rows}.built")
+    if os.path.exists(marker):
+        return vector_db, None, vector_db._collection.count()
+    start = time.perf_counter()
+    source = bank_path(rows)
+    chunks = embed_and_store(
+        (dict(chunk, metadata=chunk_metadata(chunk, source)) for chunk in iter_chunks(source)), vector_db,
+        # Synthetic chunks stay out of the shared embedding cache, and the build time is real embedding work
+        progress=None, cached=False,
+    )
+    build_seconds = time.perf_counter() - start
+    with open(marker, "w") as f:
+        f.write(str(chunks))
+    return vector_db, build_seconds, chunks
+
+
+def measure(fn, repeat, track_memory=True):
+    """Time `repeat` calls of fn, then one more under tracemalloc for the peak allocation."""
+    times = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for run in range(repeat):
+            start = time.perf_counter()
+            fn(run)
+            times.append(time.perf_counter() - start)
+        peak = None
+        if track_memory:
+            tracemalloc.start()
+            try:
+                fn(repeat)
+                peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            finally:
+                tracemalloc.stop()
+    return summarize(times, peak)
+
+
+def summarize(times, peak_mb=None):
+    return {
+        "runs": len(times),
+        "p50": float(np.percentile(times, 50)),
+        "p95": float(np.percentile(times, 95)),
+        "mean": float(np.mean(times)),
+        "peak_mb": None if peak_mb is None else round(peak_mb, 2),
+    }
+
+
+def run_benchmarks(scales=SCALES, stages=STAGES, repeat=5):
+    """Run the selected stages at every scale; returns a list of result dicts."""
+    results = []
+
+    def record(stage, scale, summary, items=None):
+        results.append({"stage": stage, "scale": scale, "items": items, **summary})
+        print(f"{stage:<20} {str(scale):>9} {summary['runs']:>4} runs  p50 {summary['p50'] * 1000:10.2f} ms  "
+              f"p95 {summary['p95'] * 1000:10.2f} ms  peak {summary['peak_mb'] or 0:9.2f} MB"
+              + (f"  ({items} items)" if items is not None else ""))
+
+    if "embedding_load" in stages:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        record("embedding_load", None,
+               measure(lambda _: HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME), repeat))
+
+    stub = StubBackend(latency=0)
+    insurance_type, region, line_of_business = INSURANCE_TYPES[0], REGIONS[0], LINES_OF_BUSINESS[0]
+    for scale in scales:
+        # Without an index, the first chunks of the bank stand in for the retrieved examples
+        context = "\n".join(chunk["text"] for _, chunk in zip(range(4), iter_chunks(bank_path(scale))))
+        if {"index_build", "similarity_search", "mmap_search", "hybrid_search"} & set(stages):
+            vector_db, build_seconds, chunks = bench_index(scale)
+            if "index_build" in stages and build_seconds is not None:
+                record("index_build", scale, summarize([build_seconds]), chunks)
+
+            def search(run):
+                query = f"{insurance_type} {region} {line_of_business} {QUERIES[run % len(QUERIES)]}"
+                return vector_db.similarity_search(query, k=4)
+
+            if "similarity_search" in stages:
+                record("similarity_search", scale, measure(search, repeat))
+            if "mmap_search" in stages:
+                index_path = os.path.join(BENCH_DIR, f"index_{scale}")
+                if not os.path.exists(index_path):
+                    build_start = time.perf_counter()
+                    build_vector_index(vector_db, index_path)
+                    record("mmap_build", scale, summarize([time.perf_counter() - build_start]), chunks)
+                load_start = time.perf_counter()
+                store = MmapVectorStore(index_path, get_embedding_model())
+                record("mmap_load", scale, summarize([time.perf_counter() - load_start]))
+                record("mmap_search", scale, measure(
+                    lambda run: store.similarity_search(
+                        f"{insurance_type} {region} {line_of_business} {QUERIES[run % len(QUERIES)]}", k=4),
+                    repeat,
+                ))
+            if "hybrid_search" in stages:
+                retriever = HybridRetriever(vector_db, get_embedding_model(), manifest_path=None)
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    build_start = time.perf_counter()
+                    retriever.bm25()
+                record("bm25_build", scale, summarize([time.perf_counter() - build_start]), chunks)
+                record("hybrid_search", scale, measure(
+                    lambda run: retriever.retrieve(f"{insurance_type} {region} {QUERIES[run % len(QUERIES)]}", 4),
+                    repeat,
+                ))
+            context = "\n".join(doc.page_content for doc in search(0))
+
+        def prompt(run, count=MAX_TEST_CASES):
+            return build_prompt(insurance_type, region, line_of_business, QUERIES[run % len(QUERIES)], count,
+                                context=context)
+
+        if "prompt_assembly" in stages:
+            record("prompt_assembly", scale, measure(prompt, repeat))
+
+        # Parsing cost depends on the response, not the bank, so the stub answers a full-size request
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            response = stub.synthesize(prompt(0))
+        if "clean_ai_response" in stages:
+            record("clean_ai_response", scale, measure(lambda _: clean_ai_response(response), repeat), MAX_TEST_CASES)
+        if "parse_response" in stages:
+            record("parse_response", scale, measure(lambda _: parse_response(response), repeat), MAX_TEST_CASES)
+
+        formatters = {
+            "format_txt": format_test_cases_for_txt,
+            "format_excel": format_test_cases_for_excel,
+            "format_docx": format_test_cases_for_docx_bytes,
+        }
+        selected = [stage for stage in formatters if stage in stages]
+        if selected:
+            bank = pd.read_csv(bank_path(scale), nrows=max(EXPORT_LIMITS[stage] for stage in selected))
+            cases = dataframe_to_cases(bank)
+            del bank
+            for stage in selected:
+                subset = cases[:EXPORT_LIMITS[stage]]
+                record(stage, scale, measure(lambda _: formatters[stage](subset), repeat), len(subset))
+    return results
+
+
+def _key(result):
+    return f"{result['stage']}@{result['scale']}"
+
+
+def compare(results, baseline, tolerance=0.2, min_seconds=0.001):
+    """Stages whose p95 grew more than `tolerance` over the baseline (ignoring sub-millisecond noise)."""
+    previous = {_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get(_key(result))
+        if not before or result["p95"] < min_seconds:
+            continue
+        ratio = result["p95"] / max(before["p95"], 1e-9)
+        if ratio > 1 + tolerance:
+            regressions.append({"key": _key(result), "baseline_p95": before["p95"], "p95": result["p95"],
+                                "ratio": round(ratio, 2)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval, prompting, parsing and export stages.")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES, help="Synthetic test bank sizes in rows")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per stage")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE_PATH, help="Store the results as the baseline")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, help="Fail on p95 regressions against a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed p95 growth before it counts as a regression")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scales, args.stages, args.repeat)
+    report = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat": args.repeat, "results": results}
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression['key']}: p95 {regression['baseline_p95'] * 1000:.2f} ms -> "
+                  f"{regression['p95'] * 1000:.2f} ms (x{regression['ratio']})")
+        if regressions:
+            raise SystemExit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,5 +7,103 @@ load_dotenv()
 
 # Configuration settings
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# "groq"; "record" to also save every response to LLM_RECORDINGS_PATH; "stub" for the offline
+# backend, which replays LLM_RECORDINGS_PATH and makes up responses for anything not recorded
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+LLM_MODEL = os.getenv("LLM_MODEL", "llama3-70b-8192")
+# Tried in order once LLM_MODEL is unavailable or keeps failing
+LLM_FALLBACK_MODELS = [m for m in os.getenv("LLM_FALLBACK_MODELS", "llama-3.3-70b-versatile").split(",") if m]
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))  # Retries per model on 429/5xx/connection errors
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # Seconds for a whole request
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))  # Keep-alive connections to the API
+LLM_RECORDINGS_PATH = os.getenv("LLM_RECORDINGS_PATH", "./cache/llm_recordings.jsonl")
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", "0.5"))  # Seconds before the stub answers an unrecorded prompt
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
-CHROMA_DB_PATH = "./chroma_db"
\ No newline at end of file
+EMBEDDING_MAX_TOKENS = 256  # Tokens of a text EMBEDDING_MODEL_NAME reads; the rest is truncated
+CHROMA_DB_PATH = "./chroma_db"
+
+# Selections offered in the UI and used as the default batch matrix
+INSURANCE_TYPES = ["Auto", "Health", "Home", "Life"]
+REGIONS = ["North America", "Europe", "Asia Pacific", "ANZ"]
+LINES_OF_BUSINESS = ["Retail", "Commercial", "Enterprise"]
+
+# Test bank ingestion
+TEST_BANK_PATH = "test.csv"  # Imported into the store below the first time create_embeddings.py runs
+# Managed test bank (SQLite) that ingestion reads and accepted generated cases are appended to
+TEST_BANK_DB_PATH = os.getenv("TEST_BANK_DB_PATH", "./test_bank.sqlite3")
+CHUNK_SIZE = 3  # Number of test bank rows per embedded chunk with the "fixed" strategy
+# How rows are split into chunks: "fixed" (CHUNK_SIZE rows), "row", "requirement" (one Requirement ID)
+# or "tokens"; compare them with retrieval_eval.py
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "fixed")
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", str(EMBEDDING_MAX_TOKENS)))  # requirement/tokens chunks stop where the model truncates
+INGEST_MANIFEST_PATH = os.path.join(CHROMA_DB_PATH, "ingest_manifest.json")
+INGEST_READ_SIZE = 10_000  # Rows read from the CSV at a time while indexing
+RETRIEVAL_K = 4  # Test bank chunks retrieved as examples for the prompt
+
+# Retrieval: "hybrid" fuses BM25 and vector search, then diversifies with MMR; "dense" is vector search only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))  # Candidates taken from each retriever
+RETRIEVAL_QUERY_CHARS = int(os.getenv("RETRIEVAL_QUERY_CHARS", "1000"))  # Requirements text embedded for the query
+RETRIEVAL_BUDGET_MS = int(os.getenv("RETRIEVAL_BUDGET_MS", "250"))  # Optional steps are skipped beyond this
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1 ranks purely by relevance, lower values favour diversity
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")  # e.g. cross-encoder/ms-marco-MiniLM-L-6-v2; empty disables reranking
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "10"))  # Top fused candidates rescored by the cross-encoder
+
+# Store queried at run time: "chroma", or "mmap" for the read-only memory-mapped index that
+# create_embeddings.py exports from Chroma to VECTOR_INDEX_PATH
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "./vector_index")
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float16")  # or "int8": half the size, slightly less exact
+VECTOR_INDEX_NLIST = int(os.getenv("VECTOR_INDEX_NLIST", "0"))  # IVF lists; 0 searches every vector
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "8"))  # IVF lists searched per query
+
+# Embedding engine used for bulk indexing
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))  # >1 spreads batches over a process pool
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")  # or "onnx" for the ONNX export of the same model
+
+# Persistent embedding cache for queries, requirement text and ingested chunks; an empty path disables it
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./cache/embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+
+# Response cache for repeated generation requests
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "./cache/responses.sqlite3")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))  # Seconds; 0 keeps entries forever
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+# Cosine similarity above which near-identical requirements reuse a cached response; unset (the default) disables it.
+# Only requirements within EMBEDDING_MAX_TOKENS are compared; longer ones need an exact match
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "") or 0) or None
+
+# Prompt token budget
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "8192"))  # Context window of LLM_MODEL
+OUTPUT_TOKENS_PER_CASE = int(os.getenv("OUTPUT_TOKENS_PER_CASE", "250"))  # Response room reserved per requested case
+PROMPT_SAFETY_TOKENS = 256  # Slack for token-count estimation error
+REQUIREMENTS_SHARE = 0.6  # Share of the free prompt space requirements may take when examples compete for it
+
+# Near-duplicate detection for generated cases; off unless DEDUP_THRESHOLD is set. Cases written from one template
+# embed close together, so keep it high (e.g. 0.97) to catch repeats without dropping distinct scenarios
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "") or 0) or None  # Cosine similarity counted as a duplicate
+DEDUP_ACTION = os.getenv("DEDUP_ACTION", "regenerate")  # "drop" duplicates, or "regenerate" them in fan-out runs
+DEDUP_BANK_CANDIDATES = 2  # Nearest test bank chunks whose examples each case is checked against
+
+# Fan-out generation for large suites
+SHARD_SIZE = int(os.getenv("SHARD_SIZE", "10"))  # Test cases requested per LLM call
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "4"))  # Shard calls in flight at once
+MAX_TEST_CASES = 200
+# Requirements that split into at least this many acceptance criteria are generated per criterion; 0 disables
+CRITERIA_MIN = int(os.getenv("CRITERIA_MIN", "3"))
+
+# Request tracing: "prometheus" aggregates stage latencies, "json" logs every trace to TRACE_LOG_PATH ("-" for stderr)
+TRACE_SINKS = set(filter(None, os.getenv("TRACE_SINKS", "prometheus").split(",")))
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "./cache/traces.jsonl")
+TRACE_RECENT = int(os.getenv("TRACE_RECENT", "50"))  # Finished traces kept in memory for the app's trace panel
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # Serve Prometheus metrics from the Streamlit app; 0 disables
+
+# HTTP generation service
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "4"))  # Generations running at once
+API_TENANT_CONCURRENCY = int(os.getenv("API_TENANT_CONCURRENCY", "2"))  # Generations running at once per tenant
+API_MAX_PENDING = int(os.getenv("API_MAX_PENDING", "100"))  # Queued + running jobs before new ones get 429
+API_TENANT_MAX_PENDING = int(os.getenv("API_TENANT_MAX_PENDING", "20"))  # Same limit, per tenant
+API_JOB_RETENTION = int(os.getenv("API_JOB_RETENTION", "500"))  # Finished jobs kept for result lookups
@@ -1,49 +1,60 @@
+# create_embeddings.py
+import argparse
 import os
-from dotenv import load_dotenv
-import pandas as pd
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
 
-# Load environment variables
-load_dotenv()
+from config import (
+    TEST_BANK_PATH, TEST_BANK_DB_PATH, CHUNK_SIZE, CHUNK_STRATEGY, CHUNK_MAX_TOKENS, EMBED_BATCH_SIZE, EMBED_WORKERS,
+    VECTOR_STORE, VECTOR_INDEX_PATH,
+)
+from ingestion import CHUNK_STRATEGIES, ingest
+from test_bank import TestBank, is_store
 
-# Initialize HuggingFace embeddings
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-print("HuggingFace embeddings initialized successfully.")
 
-# Load the test bank
-test_bank = pd.read_csv("test.csv")
-print("Test bank loaded successfully.")
-print(f"Test bank columns: {test_bank.columns}")
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally index the test bank into the Chroma database.")
+    parser.add_argument("--source", default=TEST_BANK_DB_PATH,
+                        help="Test bank store to index (a CSV or Excel bank is indexed directly)")
+    parser.add_argument("--import", dest="import_path", nargs="?", const=TEST_BANK_PATH,
+                        help=f"Import a CSV or Excel bank into the store first, replacing its earlier import "
+                             f"(default {TEST_BANK_PATH}; done automatically while the store does not exist)")
+    parser.add_argument("--chunk-strategy", choices=CHUNK_STRATEGIES, default=CHUNK_STRATEGY,
+                        help="How rows are grouped into chunks")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Number of rows per chunk (fixed strategy)")
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_MAX_TOKENS,
+                        help="Token limit per chunk (requirement and tokens strategies)")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Chunks embedded per batch")
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS,
+                        help="Embedding worker processes (1 embeds in-process)")
+    parser.add_argument("--vector-index", nargs="?", const=VECTOR_INDEX_PATH,
+                        default=VECTOR_INDEX_PATH if VECTOR_STORE == "mmap" else None,
+                        help="Also export the memory-mapped index here (default when VECTOR_STORE=mmap)")
+    args = parser.parse_args()
+    if args.import_path and not is_store(args.source):
+        parser.error("--import needs a test bank store (.sqlite3) as --source")
 
-# Function to chunk multiple rows together
-def chunk_rows(rows, chunk_size=3):
-    chunks = []
-    for i in range(0, len(rows), chunk_size):
-        chunk = rows[i:i + chunk_size]
-        chunk_text = "\n".join([
-            f"Test Case {row['Sl No.']}:\n"
-            f"Description: {row['Test Case Description']}\n"
-            f"Steps: {row['Execution Steps']}\n"
-            f"Expected Result: {row['Expected Result']}\n"
-            for _, row in chunk.iterrows()
-        ])
-        chunks.append(chunk_text)
-        print(f"Created chunk for rows {i+1} to {min(i+chunk_size, len(rows))}")
-    return chunks
+    try:
+        if args.import_path is None and args.source == TEST_BANK_DB_PATH and not os.path.exists(TEST_BANK_DB_PATH):
+            args.import_path = TEST_BANK_PATH
+        if args.import_path:
+            bank = TestBank(args.source)
+            try:
+                print(f"Importing {args.import_path} into {args.source}...")
+                print(f"{bank.import_file(args.import_path)} test cases imported.")
+            finally:
+                bank.close()
+        print(f"Indexing {args.source} into Chroma DB...")
+        stats = ingest(args.source, args.chunk_size, batch_size=args.batch_size, workers=args.workers,
+                       index_path=args.vector_index, strategy=args.chunk_strategy, max_tokens=args.max_tokens)
+        print(
+            f"{stats['chunks']} chunks: "
+            f"{stats['upserted']} upserted, {stats['deleted']} deleted, {stats['unchanged']} unchanged."
+        )
+        if stats["indexed"] is not None:
+            print(f"Memory-mapped index of {stats['indexed']} chunks written to {args.vector_index}")
+    except Exception as e:
+        print(f"Error indexing test bank: {e}")
+        raise SystemExit(1)
 
-# Convert the test bank into chunks
-chunk_size = 3  # Number of rows per chunk
-documents = chunk_rows(test_bank, chunk_size)
-print(f"Number of chunks created: {len(documents)}")
-print(f"Sample chunk:\n{documents[0]}")  # Print the first chunk for verification
 
-# Create Chroma DB
-try:
-    print("Creating Chroma DB...")
-    vector_db = Chroma.from_texts(documents, embeddings, persist_directory="./chroma_db")
-    print("Chroma DB created successfully.")
-    print(f"Number of embeddings stored: {len(vector_db.get()['ids'])}")  # Print the number of embeddings stored
-except Exception as e:
-    print(f"Error creating Chroma DB: {e}")
-    
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,11 @@
 # database.py
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma  # Updated import
 import streamlit as st
-from config import EMBEDDING_MODEL_NAME, CHROMA_DB_PATH
+from resources import get_vector_db
 
 def initialize_vector_db():
-    """Initialize and return the Chroma vector database."""
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    """Return the process-wide Chroma vector database."""
     try:
-        vector_db = Chroma(persist_directory=CHROMA_DB_PATH, embedding_function=embeddings)
-        return vector_db
+        return get_vector_db()
     except Exception as e:
         st.error(f"Error loading Chroma DB: {e}")
-        st.stop()
\ No newline at end of file
+        st.stop()
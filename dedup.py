@@ -0,0 +1,111 @@
+# dedup.py
+import threading
+
+import numpy as np
+
+import tracing
+from bank_metadata import filter_cascade, indexed_fields
+from config import DEDUP_THRESHOLD, DEDUP_BANK_CANDIDATES
+from prompt_budget import split_examples
+from resources import get_embeddings, get_vector_db
+
+
+def case_text(case):
+    """A test case rendered like a test bank example, so the two embed comparably"""
+    steps = "\n".join(str(step) for step in case.steps)
+    return f"Description: {case.description}\nSteps: {steps}\nExpected Result: {case.expected_result}"
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+
+class DedupIndex:
+    """Embeddings of the cases accepted so far in one suite.
+
+    New cases are embedded in one batch and compared with every accepted
+    case and with the closest test bank examples; those at or above
+    `threshold` cosine similarity are duplicates. Each case gets a novelty
+    score of 1 - its highest similarity. Bank chunks hold several examples,
+    so the nearest chunks are split and their examples embedded (once per
+    index) rather than comparing against the diluted chunk embedding.
+    """
+
+    def __init__(self, embeddings, vector_db=None, where=None, threshold=DEDUP_THRESHOLD,
+                 bank_candidates=DEDUP_BANK_CANDIDATES):
+        self.embeddings = embeddings
+        self.vector_db = vector_db
+        self.where = where
+        self.threshold = threshold
+        self.bank_candidates = bank_candidates
+        self.vectors = None
+        self._examples = {}
+        self._lock = threading.Lock()
+
+    def _bank_similarity(self, vectors):
+        """Highest similarity of each vector to a test bank example"""
+        if self.vector_db is None or not self.bank_candidates:
+            return np.zeros(len(vectors), dtype=np.float32)
+        with tracing.span("dedup_bank_search"):
+            found = self.vector_db._collection.query(
+                query_embeddings=vectors.tolist(), n_results=self.bank_candidates, where=self.where,
+                include=["documents"],
+            )
+        candidates = [[example for chunk in chunks for example in split_examples(chunk)]
+                      for chunks in found["documents"]]
+        new = list(dict.fromkeys(example for examples in candidates for example in examples
+                                 if example not in self._examples))
+        if new:
+            self._examples.update(zip(new, _normalize(self.embeddings.embed_documents(new))))
+        return np.array([
+            max((float(self._examples[example] @ vector) for example in examples), default=0.0)
+            for vector, examples in zip(vectors, candidates)
+        ], dtype=np.float32)
+
+    def add(self, test_cases):
+        """Accept the novel cases among `test_cases`, setting each one's novelty.
+
+        Returns (kept, duplicates).
+        """
+        if not test_cases:
+            return [], []
+        with self._lock, tracing.span("dedup", cases=len(test_cases)) as current:
+            vectors = _normalize(self.embeddings.embed_documents([case_text(case) for case in test_cases]))
+            bank = self._bank_similarity(vectors)
+            kept = []
+            duplicates = []
+            for case, vector, bank_similarity in zip(test_cases, vectors, bank):
+                similarity = float(bank_similarity)
+                if self.vectors is not None:
+                    similarity = max(similarity, float((self.vectors @ vector).max()))
+                case.novelty = round(max(0.0, 1 - similarity), 3)
+                if similarity >= self.threshold:
+                    duplicates.append(case)
+                    continue
+                kept.append(case)
+                self.vectors = vector[None] if self.vectors is None else np.vstack([self.vectors, vector])
+            current.set(kept=len(kept), duplicates=len(duplicates))
+        tracing.add(duplicates_dropped=len(duplicates))
+        return kept, duplicates
+
+
+def new_dedup_index(insurance_type=None):
+    """A DedupIndex for one suite, checking the bank within the insurance type; None when dedup is off"""
+    if DEDUP_THRESHOLD is None:
+        return None
+    where = filter_cascade(insurance_type, None, None, indexed_fields())[0]
+    return DedupIndex(get_embeddings(), get_vector_db(), where)
+
+
+def shortfall(requested, returned, duplicates=0):
+    """A diagnostic for a suite with fewer cases than requested, as a list to extend the parse diagnostics with"""
+    if returned >= requested:
+        return []
+    return [{"requested": requested, "returned": returned, "duplicates": duplicates}]
+
+
+def drop_duplicates(test_cases, insurance_type=None):
+    """The cases of one suite that are neither near-duplicates of each other nor of the test bank"""
+    index = new_dedup_index(insurance_type)
+    return test_cases if index is None else index.add(test_cases)[0]
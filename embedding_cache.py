@@ -0,0 +1,169 @@
+# embedding_cache.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import tracing
+
+
+def normalize_text(text):
+    """Collapse whitespace; the tokenizer ignores it, so the embedding does not change."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class EmbeddingCache:
+    """Persistent SQLite cache of embeddings, keyed by model, kind and normalized text.
+
+    `kind` separates query from document embeddings, which some models
+    compute differently. Hits refresh an entry's last use; beyond
+    `max_entries` entries or `max_bytes` of vectors the least recently used
+    ones are evicted. The entry count and vector bytes are kept up to date by
+    triggers in a one-row totals table, so a put checks the caps without
+    scanning the cache. Safe to share between threads and, through SQLite's
+    WAL mode, between processes.
+    """
+
+    def __init__(self, path, model_name, max_entries=200_000, max_bytes=512 * 2 ** 20):
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # One transaction, so a cache created by an older version is counted exactly once
+        self._conn.executescript("""
+            BEGIN IMMEDIATE;
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used);
+            CREATE TABLE IF NOT EXISTS embedding_totals (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                entries INTEGER NOT NULL,
+                bytes INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO embedding_totals
+                SELECT 0, COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings;
+            CREATE TRIGGER IF NOT EXISTS embeddings_insert AFTER INSERT ON embeddings BEGIN
+                UPDATE embedding_totals SET entries = entries + 1, bytes = bytes + LENGTH(new.vector);
+            END;
+            CREATE TRIGGER IF NOT EXISTS embeddings_delete AFTER DELETE ON embeddings BEGIN
+                UPDATE embedding_totals SET entries = entries - 1, bytes = bytes - LENGTH(old.vector);
+            END;
+            CREATE TRIGGER IF NOT EXISTS embeddings_update AFTER UPDATE OF vector ON embeddings BEGIN
+                UPDATE embedding_totals SET bytes = bytes - LENGTH(old.vector) + LENGTH(new.vector);
+            END;
+            COMMIT;
+        """)
+
+    def _key(self, text, kind):
+        payload = f"{self.model_name}\n{kind}\n{normalize_text(text)}"
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get_many(self, texts, kind="document"):
+        """Cached vector (a list of floats) per text, None where missing"""
+        keys = [self._key(text, kind) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's limit on bound parameters
+            for start in range(0, len(keys), 500):
+                part = list(set(keys[start:start + 500]))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part,
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+            hits = sum(key in found for key in keys)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        tracing.add(embedding_cache_hits=hits, embedding_cache_misses=len(keys) - hits)
+        return [np.frombuffer(found[key], dtype=np.float32).tolist() if key in found else None for key in keys]
+
+    def put_many(self, texts, vectors, kind="document"):
+        """Store embeddings and evict the least recently used entries beyond the size caps."""
+        now = time.time()
+        rows = [(self._key(text, kind), np.asarray(vector, dtype=np.float32).tobytes(), now)
+                for text, vector in zip(texts, vectors)]
+        with self._lock:
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete would skip the totals trigger
+            self._conn.executemany(
+                "INSERT INTO embeddings (key, vector, last_used) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET vector = excluded.vector, last_used = excluded.last_used",
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _totals(self):
+        return self._conn.execute("SELECT entries, bytes FROM embedding_totals").fetchone()
+
+    def _evict(self):
+        count, size = self._totals()
+        excess = count - self.max_entries
+        if size > self.max_bytes and count:
+            excess = max(excess, -(-(size - self.max_bytes) * count // size))
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            count, size = self._totals()
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "megabytes": round(size / 2 ** 20, 1),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings:
+    """Wraps a LangChain embeddings object so repeated texts are served from an EmbeddingCache."""
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        vectors = self.cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            computed = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            self.cache.put_many(missing, computed.values())
+            vectors = [computed[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def embed_query(self, text):
+        [vector] = self.cache.get_many([text], kind="query")
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many([text], [vector], kind="query")
+        return vector
@@ -0,0 +1,122 @@
+# embedding_engine.py
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
+from config import EMBEDDING_MODEL_NAME, EMBED_BATCH_SIZE, EMBED_WORKERS, EMBED_BACKEND
+from resources import get_embedding_cache, get_embedding_model, get_embeddings
+
+# Model loaded once in each pool worker by _init_worker
+_worker_model = None
+
+
+def _init_worker(model_name, backend, threads):
+    """Load the sentence-transformers model inside a pool worker."""
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    # Split the cores between workers instead of letting each one grab them all
+    torch.set_num_threads(threads)
+    if backend == "torch":
+        _worker_model = SentenceTransformer(model_name)
+    else:
+        # "onnx" / "openvino" need sentence-transformers >= 3.2
+        _worker_model = SentenceTransformer(model_name, backend=backend)
+
+
+def _embed_batch(texts):
+    """Embed one batch in a pool worker."""
+    return _worker_model.encode(texts, batch_size=len(texts)).tolist()
+
+
+def _batches(chunks, batch_size):
+    """Yield lists of at most `batch_size` chunks from any iterable."""
+    chunks = iter(chunks)
+    while True:
+        batch = list(islice(chunks, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _store(vector_db, batch, vectors):
+    """Write one embedded batch straight into the Chroma collection."""
+    vector_db._collection.upsert(
+        ids=[chunk["id"] for chunk in batch],
+        embeddings=vectors,
+        documents=[chunk["text"] for chunk in batch],
+        metadatas=[chunk["metadata"] for chunk in batch],
+    )
+
+
+def print_progress(done, elapsed):
+    """Default progress reporter: chunks embedded so far and throughput."""
+    rate = done / elapsed if elapsed else 0.0
+    print(f"Embedded {done} chunks ({rate:.1f} chunks/s)")
+
+
+def embed_and_store(chunks, vector_db, batch_size=EMBED_BATCH_SIZE, workers=EMBED_WORKERS,
+                    backend=EMBED_BACKEND, progress=print_progress, cached=True):
+    """Embed a stream of chunks in batches and upsert each batch as it finishes.
+
+    `chunks` is any iterable of {"id", "text", "metadata"} dicts and is consumed
+    lazily, so the whole test bank never has to sit in memory. With `workers`
+    above 1 the batches are spread over a CPU process pool; otherwise they are
+    embedded in-process with the shared model. Either way, texts already in
+    the embedding cache are not embedded again; `cached=False` bypasses the
+    cache entirely. Returns the number of chunks stored.
+    """
+    start = time.perf_counter()
+    done = 0
+
+    if workers <= 1:
+        embeddings = get_embeddings() if cached else get_embedding_model()
+        for batch in _batches(chunks, batch_size):
+            _store(vector_db, batch, embeddings.embed_documents([chunk["text"] for chunk in batch]))
+            done += len(batch)
+            if progress:
+                progress(done, time.perf_counter() - start)
+        return done
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # Pool workers load their own model, so the cache is consulted here before a batch is sent out
+    cache = get_embedding_cache() if cached else None
+    # Bound the batches in flight so memory stays flat however large the bank is
+    max_pending = workers * 2
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(EMBEDDING_MODEL_NAME, backend, threads)) as pool:
+        pending = {}
+
+        def finish(batch, vectors):
+            nonlocal done
+            _store(vector_db, batch, vectors)
+            done += len(batch)
+            if progress:
+                progress(done, time.perf_counter() - start)
+
+        def drain():
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                batch, vectors = pending.pop(future)
+                missing = [index for index, vector in enumerate(vectors) if vector is None]
+                for index, vector in zip(missing, future.result()):
+                    vectors[index] = vector
+                if cache is not None:
+                    cache.put_many([batch[index]["text"] for index in missing], [vectors[index] for index in missing])
+                finish(batch, vectors)
+
+        for batch in _batches(chunks, batch_size):
+            texts = [chunk["text"] for chunk in batch]
+            vectors = cache.get_many(texts) if cache is not None else [None] * len(texts)
+            missing = [text for text, vector in zip(texts, vectors) if vector is None]
+            if not missing:
+                finish(batch, vectors)
+                continue
+            if len(pending) >= max_pending:
+                drain()
+            pending[pool.submit(_embed_batch, missing)] = (batch, vectors)
+        while pending:
+            drain()
+    return done
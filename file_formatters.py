@@ -1,76 +1,134 @@
 # file_formatters.py
+import hashlib
+import re
 from docx import Document
 from io import BytesIO
 from openpyxl import Workbook
-from openpyxl.styles import Alignment, Font, PatternFill
-from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, PatternFill
+from openpyxl.utils import get_column_letter
 
 def format_test_cases_for_txt(test_cases):
     """Format test cases for TXT download"""
     formatted_text = ""
     for case in test_cases:
-        formatted_text += f"Test Case {case['Sl No.']}: {case['Test Case Description']}\n"
-        formatted_text += f"Sl No.: {case['Sl No.']}\n"
-        formatted_text += f"Requirement ID: {case['Requirement ID']}\n"
-        formatted_text += f"Test Case ID: {case['Test Case ID']}\n"
-        formatted_text += f"Module: {case['Module']}\n"
-        formatted_text += f"Test Case Description: {case['Test Case Description']}\n"
-        formatted_text += f"Execution Steps:\n{case['Execution Steps']}\n"
-        formatted_text += f"Expected Result: {case['Expected Result']}\n\n"
+        formatted_text += f"Test Case {case.sl_no}: {case.description}\n"
+        formatted_text += f"Sl No.: {case.sl_no}\n"
+        formatted_text += f"Requirement ID: {case.requirement_id}\n"
+        formatted_text += f"Test Case ID: {case.test_case_id}\n"
+        formatted_text += f"Module: {case.module}\n"
+        formatted_text += f"Test Case Description: {case.description}\n"
+        formatted_text += f"Execution Steps:\n{case.steps_text}\n"
+        formatted_text += f"Expected Result: {case.expected_result}\n\n"
     return formatted_text
 
 def format_test_cases_for_docx(test_cases):
     """Format test cases for Word (DOCX) download"""
     doc = Document()
     for case in test_cases:
-        doc.add_heading(f"Test Case {case['Sl No.']}: {case['Test Case Description']}", level=1)
-        doc.add_paragraph(f"Sl No.: {case['Sl No.']}")
-        doc.add_paragraph(f"Requirement ID: {case['Requirement ID']}")
-        doc.add_paragraph(f"Test Case ID: {case['Test Case ID']}")
-        doc.add_paragraph(f"Module: {case['Module']}")
-        doc.add_paragraph(f"Test Case Description: {case['Test Case Description']}")
+        doc.add_heading(f"Test Case {case.sl_no}: {case.description}", level=1)
+        doc.add_paragraph(f"Sl No.: {case.sl_no}")
+        doc.add_paragraph(f"Requirement ID: {case.requirement_id}")
+        doc.add_paragraph(f"Test Case ID: {case.test_case_id}")
+        doc.add_paragraph(f"Module: {case.module}")
+        doc.add_paragraph(f"Test Case Description: {case.description}")
         doc.add_paragraph("Execution Steps:")
-        doc.add_paragraph(case['Execution Steps'])
-        doc.add_paragraph(f"Expected Result: {case['Expected Result']}")
+        doc.add_paragraph(case.steps_text)
+        doc.add_paragraph(f"Expected Result: {case.expected_result}")
         doc.add_paragraph("\n")  # Add space between test cases
     return doc
 
-def format_test_cases_for_excel(test_cases):
-    """Format test cases for Excel download"""
-    excel_buffer = BytesIO()
-    wb = Workbook()
-    ws = wb.active
-    
-    # Add headers
-    headers = ["Sl No.", "Requirement ID", "Test Case ID", "Module", "Test Case Description", "Execution Steps", "Expected Result"]
-    ws.append(headers)
-    
-    # Add data
+EXCEL_HEADERS = [
+    "Sl No.", "Requirement ID", "Test Case ID", "Module", "Test Case Description", "Execution Steps", "Expected Result",
+]
+EXCEL_STEPS_COLUMN = EXCEL_HEADERS.index("Execution Steps")
+EXCEL_MAX_COLUMN_WIDTH = 255  # Excel's own limit
+INVALID_SHEET_TITLE_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+def _excel_rows(test_cases, widths):
+    """Build the row values for one sheet, tracking the widest value per column"""
+    rows = []
     for case in test_cases:
-        ws.append([
-            case['Sl No.'],
-            case['Requirement ID'],
-            case['Test Case ID'],
-            case['Module'],
-            case['Test Case Description'],
-            case['Execution Steps'],
-            case['Expected Result']
-        ])
-    
-    # Format columns
-    for col in ws.columns:
-        max_length = max(len(str(cell.value)) for cell in col)
-        ws.column_dimensions[col[0].column_letter].width = max_length + 2
-    
-    # Highlight the header row in yellow
+        row = (case.sl_no, case.requirement_id, case.test_case_id, case.module,
+               case.description, case.steps_text, case.expected_result)
+        for index, value in enumerate(row):
+            length = len(str(value))
+            if length > widths[index]:
+                widths[index] = length
+        rows.append(row)
+    return rows
+
+def _sheet_title(name, used_titles):
+    """Excel-safe, unique sheet title (max 31 characters)"""
+    base = INVALID_SHEET_TITLE_CHARS.sub("_", str(name) or "Sheet")[:31] or "Sheet"
+    title, suffix = base, 2
+    while title.lower() in used_titles:
+        tail = f" ({suffix})"
+        title, suffix = base[:31 - len(tail)] + tail, suffix + 1
+    used_titles.add(title.lower())
+    return title
+
+def write_test_cases_excel(test_cases, target, sheet_by=None):
+    """Stream test cases into an .xlsx file path or binary file object.
+
+    Uses a write-only workbook, so rows go straight to the output instead of
+    being held as cell objects. Pass `sheet_by` (a TestCase attribute such as
+    "module") to write one sheet per distinct value.
+    """
+    if sheet_by:
+        groups = {}
+        for case in test_cases:
+            groups.setdefault(getattr(case, sheet_by) or "Other", []).append(case)
+    else:
+        groups = {"Sheet": test_cases}
+
+    wb = Workbook(write_only=True)
     yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-    for cell in ws[1]:  # Header row (first row)
-        cell.fill = yellow_fill
-    
-    # Format steps
-    for row in ws.iter_rows(min_row=2):
-        cell = row[5]  # Execution Steps column
-        cell.alignment = Alignment(wrap_text=True, vertical='top')
+    steps_alignment = Alignment(wrap_text=True, vertical='top')
+    used_titles = set()
+    for name, cases in groups.items():
+        ws = wb.create_sheet(_sheet_title(name, used_titles))
+        widths = [len(header) for header in EXCEL_HEADERS]
+        rows = _excel_rows(cases, widths)
+        
+        # Write-only sheets need column widths before the first row is written
+        for index, width in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(index)].width = min(width + 2, EXCEL_MAX_COLUMN_WIDTH)
+        
+        # Highlight the header row in yellow
+        header_cells = []
+        for header in EXCEL_HEADERS:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.fill = yellow_fill
+            header_cells.append(cell)
+        ws.append(header_cells)
+        
+        # Format steps
+        for row in rows:
+            steps_cell = WriteOnlyCell(ws, value=row[EXCEL_STEPS_COLUMN])
+            steps_cell.alignment = steps_alignment
+            ws.append(row[:EXCEL_STEPS_COLUMN] + (steps_cell,) + row[EXCEL_STEPS_COLUMN + 1:])
     
-    wb.save(excel_buffer)
-    return excel_buffer.getvalue()
\ No newline at end of file
+    wb.save(target)
+
+def format_test_cases_for_docx_bytes(test_cases):
+    """Format test cases as DOCX file contents"""
+    doc_buffer = BytesIO()
+    format_test_cases_for_docx(test_cases).save(doc_buffer)
+    return doc_buffer.getvalue()
+
+def test_cases_fingerprint(test_cases):
+    """Hash of a test-case set, used to memoize exports until the cases change"""
+    digest = hashlib.sha256()
+    for case in test_cases:
+        for value in (case.sl_no, case.requirement_id, case.test_case_id, case.module, case.lob,
+                      case.region, case.description, case.steps_text, case.expected_result):
+            digest.update(str(value).encode())
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+def format_test_cases_for_excel(test_cases, sheet_by=None):
+    """Format test cases for Excel download"""
+    excel_buffer = BytesIO()
+    write_test_cases_excel(test_cases, excel_buffer, sheet_by)
+    return excel_buffer.getvalue()
@@ -0,0 +1,338 @@
+# generation_scheduler.py
+import asyncio
+import re
+
+from config import SHARD_SIZE, GENERATION_CONCURRENCY, CRITERIA_MIN, DEDUP_ACTION
+from dedup import drop_duplicates, new_dedup_index, shortfall
+from models import renumber
+from requirement_files import split_criteria
+from resources import get_llm_backend, get_response_cache
+from test_case_generator import build_prompt, parse_traced, retrieve_context, show_generation_result
+import tracing
+
+# Each shard is steered towards a different angle so the merged suite covers more ground
+FOCUS_AREAS = [
+    "core positive business flows",
+    "negative paths and input validation",
+    "boundary values and edge conditions",
+    "integration and end-to-end journeys",
+    "security, access control and regulatory compliance",
+    "error handling, recovery and notifications",
+]
+# Extra rounds allowed to top up cases lost to parse failures or duplicates
+MAX_TOP_UP_ROUNDS = 1
+
+
+def plan_shards(num_test_cases, user_requirements, shard_size=SHARD_SIZE):
+    """Split a request for N cases into shards of at most `shard_size` cases.
+
+    When the requirements have several lines they are divided between the
+    shards so each one concentrates on its own sub-requirements.
+    """
+    shard_count = max(1, -(-num_test_cases // shard_size))
+    lines = [line.strip() for line in user_requirements.splitlines() if line.strip()]
+    shards = []
+    for index in range(shard_count):
+        count = min(shard_size, num_test_cases - index * shard_size)
+        focus = (
+            f"This is batch {index + 1} of {shard_count}. "
+            f"Concentrate on {FOCUS_AREAS[index % len(FOCUS_AREAS)]}."
+        )
+        if len(lines) > 1 and shard_count > 1:
+            part = lines[index * len(lines) // shard_count:(index + 1) * len(lines) // shard_count]
+            if part:
+                focus += " Base this batch on these requirements:\n" + "\n".join(part)
+        shards.append({"count": count, "focus": focus})
+    return shards
+
+
+async def _complete(session, semaphore, prompt):
+    """Run one completion under the concurrency limit; the backend retries 429/5xx itself."""
+    async with semaphore:
+        return await session.complete(prompt)
+
+
+async def _dedup(dedup, test_cases, duplicates):
+    """Keep the novel cases, collecting the rest in `duplicates`; embedding runs on a worker thread."""
+    if dedup is None:
+        return test_cases
+    kept, dropped = await asyncio.to_thread(dedup.add, test_cases)
+    duplicates.extend(dropped)
+    return kept
+
+
+def _still_missing(wanted, collected, duplicates):
+    """Cases a top-up round should ask for; dropped duplicates only count when they are to be regenerated"""
+    missing = wanted - len(merge_test_cases(collected, wanted))
+    return missing if DEDUP_ACTION == "regenerate" else missing - len(duplicates)
+
+
+def _avoid_note(duplicates, limit=10):
+    """Focus text steering a top-up round away from the duplicates it replaces"""
+    if not duplicates:
+        return ""
+    return "\nThese scenarios are already covered, so write different ones:\n" + "\n".join(
+        f"- {case.description}" for case in duplicates[-limit:]
+    )
+
+
+def _case_signature(case):
+    """Normalized text used to spot duplicate cases across shards."""
+    return re.sub(r"\W+", " ", case.description).strip().lower()
+
+
+def merge_test_cases(test_cases, limit=None):
+    """Drop duplicate cases and renumber Sl No. / Test Case ID sequentially."""
+    merged = []
+    seen = set()
+    for case in test_cases:
+        signature = _case_signature(case)
+        if signature in seen:
+            continue
+        seen.add(signature)
+        merged.append(case.copy())
+        if limit and len(merged) == limit:
+            break
+    return renumber(merged)
+
+
+async def _generate_sharded(insurance_type, region, line_of_business, user_requirements, num_test_cases,
+                            concurrency, on_progress):
+    context = retrieve_context(insurance_type, region, line_of_business, user_requirements)
+    semaphore = asyncio.Semaphore(concurrency)
+    dedup = new_dedup_index(insurance_type)
+    raw_responses = []
+    collected = []
+    diagnostics = []
+    duplicates = []
+    session = get_llm_backend().open_async()
+    try:
+        missing = num_test_cases
+        for _ in range(1 + MAX_TOP_UP_ROUNDS):
+            tasks = [
+                asyncio.create_task(_complete(session, semaphore, build_prompt(
+                    insurance_type, region, line_of_business, user_requirements,
+                    shard["count"], context=context, focus=shard["focus"] + _avoid_note(duplicates),
+                )))
+                for shard in plan_shards(missing, user_requirements)
+            ]
+            for task in asyncio.as_completed(tasks):
+                raw_content = await task
+                raw_responses.append(raw_content)
+                test_cases, shard_diagnostics = parse_traced(raw_content)
+                collected.extend(await _dedup(dedup, test_cases, duplicates))
+                diagnostics.extend(shard_diagnostics)
+                if on_progress:
+                    on_progress(merge_test_cases(collected, num_test_cases))
+            missing = _still_missing(num_test_cases, collected, duplicates)
+            if missing <= 0:
+                break
+    finally:
+        await session.close()
+    test_cases = merge_test_cases(collected, num_test_cases)
+    diagnostics += shortfall(num_test_cases, len(test_cases), len(duplicates))
+    return "\n\n".join(raw_responses), test_cases, diagnostics
+
+
+def generate_suite_sharded(insurance_type, region, line_of_business, user_requirements, num_test_cases,
+                           concurrency=GENERATION_CONCURRENCY, on_progress=None):
+    """Generate a large suite as concurrent shards and merge them into one numbered list.
+
+    Returns (test_cases, raw_response, diagnostics). `on_progress` is called
+    with the merged cases so far each time a shard finishes.
+    """
+    with tracing.trace("generate_suite_sharded", insurance_type=insurance_type, region=region,
+                       line_of_business=line_of_business, num_test_cases=num_test_cases) as current:
+        response_cache = get_response_cache()
+        with tracing.span("cache_lookup") as lookup:
+            cached = response_cache.get(insurance_type, region, line_of_business, user_requirements, num_test_cases)
+            lookup.set(hit=cached is not None)
+        if cached is not None:
+            current.set(cached=True)
+            test_cases, diagnostics = parse_traced(cached)
+            novel = drop_duplicates(test_cases, insurance_type)
+            merged = merge_test_cases(novel, num_test_cases)
+            return merged, cached, diagnostics + shortfall(num_test_cases, len(merged), len(test_cases) - len(novel))
+
+        raw_content, test_cases, diagnostics = asyncio.run(_generate_sharded(
+            insurance_type, region, line_of_business, user_requirements, num_test_cases, concurrency, on_progress,
+        ))
+        current.set(merged_cases=len(test_cases))
+        if test_cases:
+            response_cache.put(insurance_type, region, line_of_business, user_requirements, num_test_cases, raw_content)
+        return test_cases, raw_content, diagnostics
+
+
+def uses_criteria(user_requirements, min_criteria=CRITERIA_MIN):
+    """Whether the requirements are long enough to be generated per acceptance criterion"""
+    return bool(min_criteria) and len(split_criteria(user_requirements)[1]) >= min_criteria
+
+
+def plan_criteria(criteria, num_test_cases):
+    """Group the criteria into at most `num_test_cases` batches of consecutive criteria, with cases per batch.
+
+    Each batch is one generation and gets at least one case, so neither the
+    calls nor the suite exceed `num_test_cases`; with no more criteria than
+    cases every criterion is its own batch and the cases are spread evenly.
+    """
+    batches = min(len(criteria), max(num_test_cases, 1))
+    return [
+        {"criteria": criteria[index * len(criteria) // batches:(index + 1) * len(criteria) // batches],
+         "count": num_test_cases // batches + (index < num_test_cases % batches)}
+        for index in range(batches)
+    ]
+
+
+def _with_sections(lines, criteria):
+    """Criterion lines under the headings of the sections they come from"""
+    text = []
+    section = ""
+    for line, criterion in zip(lines, criteria):
+        if criterion.get("section", "") != section:
+            section = criterion.get("section", "")
+            text.append(section)
+        text.append(line)
+    return "\n".join(part for part in text if part)
+
+
+async def _generate_criterion(session, semaphore, dedup, insurance_type, region, line_of_business, preamble,
+                              batch):
+    """Map step: retrieve examples for one batch of criteria and generate its cases, tagged with their IDs."""
+    members = batch["criteria"]
+    count = batch["count"]
+    ids = [criterion["id"] for criterion in members]
+    label = ids[0] if len(ids) == 1 else f"{ids[0]}..{ids[-1]}"
+    with tracing.span("criterion", criterion=label, criteria=len(ids), num_test_cases=count) as current:
+        if len(members) == 1:
+            criteria_text = _with_sections([members[0]["text"]], members)
+            trace_to = f"Every test case must verify acceptance criterion {label}; use Requirement ID: {label}."
+        else:
+            criteria_text = _with_sections([f"[{criterion['id']}] {criterion['text']}" for criterion in members],
+                                           members)
+            trace_to = (f"Every test case must verify one of acceptance criteria {', '.join(ids)}; "
+                        f"use that criterion's ID as its Requirement ID.")
+        requirements = f"{preamble}\n\n{criteria_text}" if preamble else criteria_text
+        # Cached per batch, so editing one criterion only regenerates its batch. Lookups are exact: the
+        # keys of one document share the preamble, so a similarity match would serve another criterion's cases
+        cache_key = f"{criteria_text}\n[{label}]\n\n{preamble}"
+        response_cache = get_response_cache()
+        cached = await asyncio.to_thread(
+            response_cache.get, insurance_type, region, line_of_business, cache_key, count, False,
+        )
+        current.set(cached=cached is not None)
+        duplicates = []
+        if cached is not None:
+            raw_responses = [cached]
+            test_cases, diagnostics = parse_traced(cached)
+            test_cases = merge_test_cases(await _dedup(dedup, test_cases, duplicates), count)
+        else:
+            # Retrieval is synchronous; a worker thread lets the batches retrieve in parallel
+            context = await asyncio.to_thread(
+                retrieve_context, insurance_type, region, line_of_business, criteria_text,
+            )
+            raw_responses = []
+            collected = []
+            diagnostics = []
+            missing = count
+            for _ in range(1 + MAX_TOP_UP_ROUNDS):
+                shards = plan_shards(missing, "")
+                prompts = [
+                    build_prompt(insurance_type, region, line_of_business, requirements, shard["count"],
+                                 context=context,
+                                 focus=(trace_to if len(shards) == 1 else f"{shard['focus']}\n{trace_to}")
+                                 + _avoid_note(duplicates))
+                    for shard in shards
+                ]
+                for raw_content in await asyncio.gather(*[_complete(session, semaphore, prompt) for prompt in prompts]):
+                    raw_responses.append(raw_content)
+                    shard_cases, shard_diagnostics = parse_traced(raw_content)
+                    collected.extend(await _dedup(dedup, shard_cases, duplicates))
+                    diagnostics.extend(shard_diagnostics)
+                missing = _still_missing(count, collected, duplicates)
+                if missing <= 0:
+                    break
+            test_cases = merge_test_cases(collected, count)
+            if test_cases:
+                await asyncio.to_thread(
+                    response_cache.put, insurance_type, region, line_of_business, cache_key, count,
+                    "\n\n".join(raw_responses), False,
+                )
+        # Traceability comes from the split, not from whatever ID the model wrote
+        for case in test_cases:
+            if case.requirement_id not in ids:
+                case.requirement_id = label if len(ids) > 1 else ids[0]
+        current.set(cases=len(test_cases))
+    return "\n\n".join(raw_responses), test_cases, diagnostics, len(duplicates)
+
+
+def reduce_criteria(results):
+    """Reduce step: the batches' cases in document order, deduplicated and numbered as one suite."""
+    return merge_test_cases([case for result in results if result for case in result[1]])
+
+
+async def _generate_by_criteria(insurance_type, region, line_of_business, user_requirements, num_test_cases,
+                                concurrency, on_progress):
+    preamble, criteria = split_criteria(user_requirements)
+    batches = plan_criteria(criteria, num_test_cases)
+    semaphore = asyncio.Semaphore(concurrency)
+    results = [None] * len(batches)
+    # One index for the whole suite, so criteria do not repeat each other's cases either
+    dedup = new_dedup_index(insurance_type)
+    session = get_llm_backend().open_async()
+
+    async def generate(index, batch):
+        return index, await _generate_criterion(session, semaphore, dedup, insurance_type, region,
+                                                line_of_business, preamble, batch)
+
+    try:
+        tasks = [asyncio.create_task(generate(index, batch)) for index, batch in enumerate(batches)]
+        for task in asyncio.as_completed(tasks):
+            index, result = await task
+            results[index] = result
+            if on_progress:
+                on_progress(reduce_criteria(results))
+    finally:
+        await session.close()
+    raw_content = "\n\n".join(result[0] for result in results)
+    test_cases = reduce_criteria(results)
+    diagnostics = [diagnostic for result in results for diagnostic in result[2]]
+    diagnostics += shortfall(num_test_cases, len(test_cases), sum(result[3] for result in results))
+    return raw_content, test_cases, diagnostics, len(criteria)
+
+
+def generate_suite_by_criteria(insurance_type, region, line_of_business, user_requirements, num_test_cases,
+                               concurrency=GENERATION_CONCURRENCY, on_progress=None):
+    """Generate a suite per acceptance criterion (map) and merge it into one numbered list (reduce).
+
+    Criteria are batched so there are at most `num_test_cases` generations;
+    each batch gets its own retrieval and its share of the cases (at least
+    one), and its cases carry their criterion's ID in Requirement ID. Returns (test_cases, raw_response,
+    diagnostics); `on_progress` is called with the merged cases so far.
+    """
+    with tracing.trace("generate_suite_by_criteria", insurance_type=insurance_type, region=region,
+                       line_of_business=line_of_business, num_test_cases=num_test_cases) as current:
+        raw_content, test_cases, diagnostics, criteria = asyncio.run(_generate_by_criteria(
+            insurance_type, region, line_of_business, user_requirements, num_test_cases, concurrency, on_progress,
+        ))
+        current.set(criteria=criteria, merged_cases=len(test_cases))
+        return test_cases, raw_content, diagnostics
+
+
+def generate_test_cases_by_criteria(insurance_type, region, line_of_business, user_requirements, num_test_cases,
+                                    concurrency=GENERATION_CONCURRENCY, on_progress=None):
+    """Streamlit wrapper around generate_suite_by_criteria"""
+    test_cases, raw_content, diagnostics = generate_suite_by_criteria(
+        insurance_type, region, line_of_business, user_requirements, num_test_cases, concurrency, on_progress,
+    )
+    show_generation_result(raw_content, diagnostics)
+    return test_cases
+
+
+def generate_test_cases_sharded(insurance_type, region, line_of_business, user_requirements, num_test_cases,
+                                concurrency=GENERATION_CONCURRENCY, on_progress=None):
+    """Streamlit wrapper around generate_suite_sharded"""
+    test_cases, raw_content, diagnostics = generate_suite_sharded(
+        insurance_type, region, line_of_business, user_requirements, num_test_cases, concurrency, on_progress,
+    )
+    show_generation_result(raw_content, diagnostics)
+    return test_cases
@@ -0,0 +1,199 @@
+# ingestion.py
+import hashlib
+import json
+import os
+
+from bank_metadata import row_metadata
+from config import (
+    TEST_BANK_DB_PATH, CHUNK_SIZE, CHUNK_STRATEGY, CHUNK_MAX_TOKENS, INGEST_MANIFEST_PATH, INGEST_READ_SIZE,
+    EMBED_BATCH_SIZE, EMBED_WORKERS,
+)
+from embedding_engine import embed_and_store, print_progress
+from prompt_budget import count_tokens
+from resources import get_chroma
+from test_bank import read_bank
+from vector_index import build_vector_index
+
+DELETE_BATCH_SIZE = 1000
+CHUNK_STRATEGIES = ("fixed", "row", "requirement", "tokens")
+
+
+def _row_texts(rows):
+    """Render every row of the test bank as the text block used in a chunk."""
+    return (
+        "Test Case " + rows["Sl No."].astype(str) + ":\n"
+        + "Description: " + rows["Test Case Description"].astype(str) + "\n"
+        + "Steps: " + rows["Execution Steps"].astype(str) + "\n"
+        + "Expected Result: " + rows["Expected Result"].astype(str) + "\n"
+    ).tolist()
+
+
+def _row_keys(rows):
+    """Return a stable key per row, preferring the Test Case ID."""
+    if "Row Key" in rows.columns:
+        keys = rows["Row Key"]
+    elif "Test Case ID" in rows.columns:
+        keys = rows["Test Case ID"].fillna(rows["Sl No."]).astype(str)
+    else:
+        keys = rows["Sl No."].astype(str)
+    return keys.tolist()
+
+
+def _split_group(positions, texts, requirement_ids, strategy, chunk_size, max_tokens):
+    """Split the row positions of one metadata group into chunks, following `strategy`"""
+    if strategy == "row":
+        return [[position] for position in positions]
+    if strategy == "fixed":
+        return [positions[i:i + chunk_size] for i in range(0, len(positions), chunk_size)]
+    if strategy == "requirement":
+        runs = {}
+        for position in positions:
+            runs.setdefault(requirement_ids[position], []).append(position)
+        runs = list(runs.values())
+    elif strategy == "tokens":
+        runs = [positions]
+    else:
+        raise ValueError(f"Unknown chunk strategy {strategy!r}; expected one of {', '.join(CHUNK_STRATEGIES)}")
+    # Pack consecutive rows of each run while they fit in max_tokens (a longer row gets a chunk of its own)
+    chunks = []
+    for run in runs:
+        members, tokens = [], 0
+        for position in run:
+            size = count_tokens(texts[position])
+            if members and tokens + size > max_tokens:
+                chunks.append(members)
+                members, tokens = [], 0
+            members.append(position)
+            tokens += size
+        if members:
+            chunks.append(members)
+    return chunks
+
+
+def chunk_rows(rows, chunk_size=CHUNK_SIZE, seen_ids=None, strategy=CHUNK_STRATEGY, max_tokens=CHUNK_MAX_TOKENS):
+    """Group rows that share their metadata into chunks with a stable ID and a content hash.
+
+    Rows are grouped by normalized insurance type, region, line of business
+    and module, so every chunk carries one value per field and retrieval can
+    filter on them. Each group is then split by `strategy`: "fixed" takes
+    `chunk_size` rows at a time, "row" gives every row its own chunk,
+    "requirement" keeps the rows of one Requirement ID together and "tokens"
+    packs consecutive rows; the last two close a chunk at `max_tokens`.
+    The chunk ID is derived from the keys of the rows it contains, so it
+    stays the same across runs as long as the rows do; the hash changes
+    whenever the rendered text or the metadata does.
+    """
+    texts = _row_texts(rows)
+    keys = _row_keys(rows)
+    metadata = row_metadata(rows)
+    fields = list(metadata.columns)
+    if fields:
+        groups = metadata.groupby(fields, sort=False).indices
+    else:
+        groups = {(): list(range(len(texts)))}
+    if "Requirement ID" in rows.columns:
+        requirement_ids = rows["Requirement ID"].fillna("").astype(str).str.strip().tolist()
+    else:
+        requirement_ids = [""] * len(texts)
+    chunks = []
+    seen_ids = set() if seen_ids is None else seen_ids
+    for values, positions in groups.items():
+        values = values if isinstance(values, tuple) else (values,)
+        # Chroma rejects empty metadata values, so unknown fields are left out
+        chunk_fields = {field: value for field, value in zip(fields, values) if value}
+        fields_text = json.dumps(chunk_fields, sort_keys=True)
+        for members in _split_group(positions, texts, requirement_ids, strategy, chunk_size, max_tokens):
+            chunk_keys = [keys[position] for position in members]
+            chunk_text = "\n".join(texts[position] for position in members)
+            chunk_id = "chunk-" + hashlib.sha1("|".join(chunk_keys).encode()).hexdigest()
+            if chunk_id in seen_ids:
+                # Repeated row keys: fall back to a counter to keep IDs unique
+                chunk_id = f"{chunk_id}-{len(seen_ids)}"
+            seen_ids.add(chunk_id)
+            chunks.append({
+                "id": chunk_id,
+                "text": chunk_text,
+                "hash": hashlib.sha256((chunk_text + fields_text).encode()).hexdigest(),
+                "rows": ",".join(chunk_keys),
+                "fields": chunk_fields,
+            })
+    return chunks
+
+
+def iter_chunks(source, chunk_size=CHUNK_SIZE, read_size=INGEST_READ_SIZE, strategy=CHUNK_STRATEGY,
+                max_tokens=CHUNK_MAX_TOKENS):
+    """Stream chunks from the test bank store (or a CSV/Excel bank) without loading it all at once.
+
+    Chunks never span two reads, so with the "requirement" and "tokens"
+    strategies a run of rows crossing a read boundary is split there.
+    """
+    # Keep every read a whole number of chunks so chunk boundaries do not move
+    read_size = max(chunk_size, read_size - read_size % chunk_size)
+    seen_ids = set()
+    for rows in read_bank(source, read_size):
+        yield from chunk_rows(rows, chunk_size, seen_ids, strategy, max_tokens)
+
+
+def chunk_metadata(chunk, source):
+    """Metadata stored with a chunk in the vector store"""
+    return {"content_hash": chunk["hash"], "rows": chunk["rows"], "source": source, **chunk["fields"]}
+
+
+def load_manifest(path=INGEST_MANIFEST_PATH):
+    """Return the {chunk_id: content_hash} map recorded by the last run."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("chunks", {})
+
+
+def save_manifest(hashes, source, path=INGEST_MANIFEST_PATH, fields=()):
+    """Record the hash of every indexed chunk and the metadata fields retrieval can filter on."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"source": source, "fields": sorted(fields), "chunks": hashes}, f)
+    os.replace(tmp_path, path)
+
+
+def ingest(source=TEST_BANK_DB_PATH, chunk_size=CHUNK_SIZE, vector_db=None, batch_size=EMBED_BATCH_SIZE,
+           workers=EMBED_WORKERS, progress=print_progress, index_path=None, strategy=CHUNK_STRATEGY,
+           max_tokens=CHUNK_MAX_TOKENS):
+    """Bring the Chroma index in line with the test bank, touching only what changed.
+
+    The bank is streamed and only new or changed chunks are handed to the
+    embedding engine, which writes them to Chroma batch by batch. With an
+    `index_path`, the memory-mapped index there is rebuilt from Chroma
+    whenever anything changed (or it does not exist yet).
+    """
+    vector_db = vector_db or get_chroma()
+    manifest = load_manifest()
+    existing_ids = set(vector_db.get(include=[])["ids"])
+    hashes = {}
+    fields = set()
+
+    def changed_chunks():
+        for chunk in iter_chunks(source, chunk_size, strategy=strategy, max_tokens=max_tokens):
+            hashes[chunk["id"]] = chunk["hash"]
+            fields.update(chunk["fields"])
+            if chunk["id"] not in existing_ids or manifest.get(chunk["id"]) != chunk["hash"]:
+                chunk["metadata"] = chunk_metadata(chunk, source)
+                yield chunk
+
+    upserted = embed_and_store(changed_chunks(), vector_db, batch_size, workers, progress=progress)
+
+    to_delete = sorted(existing_ids - hashes.keys())
+    for i in range(0, len(to_delete), DELETE_BATCH_SIZE):
+        vector_db.delete(ids=to_delete[i:i + DELETE_BATCH_SIZE])
+
+    indexed = None
+    if index_path and (upserted or to_delete or not os.path.exists(index_path)):
+        indexed = build_vector_index(vector_db, index_path)
+    save_manifest(hashes, source, fields=fields)
+    return {
+        "chunks": len(hashes),
+        "upserted": upserted,
+        "deleted": len(to_delete),
+        "unchanged": len(hashes) - upserted,
+        "indexed": indexed,
+    }
@@ -0,0 +1,365 @@
+# llm_backend.py
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import httpx
+from groq import AsyncGroq, APIConnectionError, APIStatusError, NotFoundError, RateLimitError
+
+import tracing
+
+
+def http_limits(pool_size):
+    """Keep-alive connection pool shared by every request made through one client"""
+    return httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=30)
+
+
+def http_timeout(timeout, connect_timeout):
+    return httpx.Timeout(timeout, connect=connect_timeout)
+
+
+def retry_delay(error, attempt):
+    """Seconds to wait before retrying, honouring Retry-After on 429s."""
+    if isinstance(error, RateLimitError):
+        retry_after = error.response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after) + random.uniform(0, 1)
+            except ValueError:
+                pass
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(30, 2 ** attempt))
+
+
+def is_retryable(error):
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def _should_fall_back(error):
+    """Unknown or decommissioned models and persistent 429/5xx move on to the next model"""
+    return isinstance(error, NotFoundError) or is_retryable(error)
+
+
+def _retry_plan(error, model, attempt, max_retries):
+    """Seconds to wait before retrying the same model, or None to move on to the next one.
+
+    Retries and abandoned models are recorded on the current (llm) span.
+    """
+    current = tracing.current_span()
+    if isinstance(error, NotFoundError) or attempt == max_retries:
+        if current is not None:
+            current.set(failed_models=[*current.attributes.get("failed_models", []), model], last_error=str(error))
+        return None
+    delay = retry_delay(error, attempt)
+    if current is not None:
+        current.set(retries=current.attributes.get("retries", 0) + 1, last_error=str(error))
+    tracing.add(llm_retries=1)
+    return delay
+
+
+def _record_usage(current, usage, model=None):
+    """Put the model and token counts reported by the API on the llm span and the request totals"""
+    if model:
+        current.set(model=model)
+    if usage is not None:
+        current.set(tokens_in=usage.prompt_tokens, tokens_out=usage.completion_tokens)
+        tracing.add(tokens_in=usage.prompt_tokens, tokens_out=usage.completion_tokens)
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) for backends that report none"""
+    return len(text) // 4 + 1
+
+
+class GroqBackend:
+    """Chat completions through the Groq API.
+
+    The client keeps a pooled keep-alive HTTP connection with explicit
+    timeouts. Requests that hit a 429, a 5xx or a connection error are
+    retried with jittered backoff, up to `max_retries` times per model,
+    before moving on to the next of `fallback_models`.
+    """
+
+    def __init__(self, client, api_key, model, fallback_models=(), max_retries=3,
+                 timeout=60.0, connect_timeout=5.0, pool_size=10):
+        # Retries are handled here so they can fall back to other models
+        self.client = client.with_options(max_retries=0)
+        self.api_key = api_key
+        self.models = [model, *[m for m in fallback_models if m != model]]
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool_size = pool_size
+
+    def _call(self, request):
+        """Run request(model), retrying and falling back as configured"""
+        error = None
+        for model in self.models:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return request(model)
+                except Exception as e:
+                    if not _should_fall_back(e):
+                        raise
+                    error = e
+                    delay = _retry_plan(e, model, attempt, self.max_retries)
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+        raise error
+
+    def complete(self, prompt):
+        """Return the full completion for a prompt"""
+        with tracing.span("llm", model=self.models[0]) as current:
+            response = self._call(lambda model: self.client.chat.completions.create(
+                messages=[{"role": "user", "content": prompt}],
+                model=model,
+            ))
+            _record_usage(current, response.usage, response.model)
+            return response.choices[0].message.content
+
+    def stream(self, prompt):
+        """Yield the completion text as it arrives"""
+        with tracing.span("llm", model=self.models[0], stream=True) as current:
+            start = time.perf_counter()
+            # Errors are raised when the request is opened, so only that part is retried
+            stream = self._call(lambda model: self.client.chat.completions.create(
+                messages=[{"role": "user", "content": prompt}],
+                model=model,
+                stream=True,
+            ))
+            first = True
+            for chunk in stream:
+                # Groq reports usage on the final chunk
+                x_groq = getattr(chunk, "x_groq", None)
+                if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+                    _record_usage(current, x_groq.usage, chunk.model)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first:
+                        current.set(time_to_first_token=round(time.perf_counter() - start, 6))
+                        first = False
+                    yield delta
+
+    def open_async(self):
+        """Async session bound to the running event loop; close it when done"""
+        client = AsyncGroq(
+            api_key=self.api_key,
+            max_retries=0,
+            timeout=http_timeout(self.timeout, self.connect_timeout),
+            http_client=httpx.AsyncClient(limits=http_limits(self.pool_size)),
+        )
+        return _GroqAsyncSession(client, self)
+
+    def close(self):
+        self.client.close()
+
+
+class _GroqAsyncSession:
+    def __init__(self, client, backend):
+        self.client = client
+        self.backend = backend
+
+    async def complete(self, prompt):
+        with tracing.span("llm", model=self.backend.models[0]) as current:
+            return await self._complete(prompt, current)
+
+    async def _complete(self, prompt, current):
+        error = None
+        for model in self.backend.models:
+            for attempt in range(self.backend.max_retries + 1):
+                try:
+                    response = await self.client.chat.completions.create(
+                        messages=[{"role": "user", "content": prompt}],
+                        model=model,
+                    )
+                    _record_usage(current, response.usage, response.model)
+                    return response.choices[0].message.content
+                except Exception as e:
+                    if not _should_fall_back(e):
+                        raise
+                    error = e
+                    delay = _retry_plan(e, model, attempt, self.backend.max_retries)
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+        raise error
+
+    async def close(self):
+        await self.client.close()
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+def load_recordings(path):
+    """Recorded responses keyed by prompt hash; later entries win"""
+    recordings = {}
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    recordings[entry["prompt"]] = entry
+    return recordings
+
+
+class RecordingBackend:
+    """Wraps a backend and appends every prompt's response and latency to a JSONL file.
+
+    StubBackend replays the file, so a recorded session can be re-run
+    offline with the same responses and timings.
+    """
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def record(self, prompt, response, latency):
+        entry = {"prompt": prompt_key(prompt), "response": response, "latency": round(latency, 3)}
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def complete(self, prompt):
+        start = time.perf_counter()
+        response = self.backend.complete(prompt)
+        self.record(prompt, response, time.perf_counter() - start)
+        return response
+
+    def stream(self, prompt):
+        start = time.perf_counter()
+        pieces = []
+        for delta in self.backend.stream(prompt):
+            pieces.append(delta)
+            yield delta
+        self.record(prompt, "".join(pieces), time.perf_counter() - start)
+
+    def open_async(self):
+        return _RecordingAsyncSession(self, self.backend.open_async())
+
+    def close(self):
+        self.backend.close()
+
+
+class _RecordingAsyncSession:
+    def __init__(self, recorder, session):
+        self.recorder = recorder
+        self.session = session
+
+    async def complete(self, prompt):
+        start = time.perf_counter()
+        response = await self.session.complete(prompt)
+        self.recorder.record(prompt, response, time.perf_counter() - start)
+        return response
+
+    async def close(self):
+        await self.session.close()
+
+
+def _record_estimate(prompt, text):
+    tracing.add(tokens_in=estimate_tokens(prompt), tokens_out=estimate_tokens(text))
+
+
+class StubBackend:
+    """Offline backend that answers deterministically in the expected test case format.
+
+    Prompts found in `recordings` (see RecordingBackend) get the recorded
+    response after the recorded latency. Any other prompt gets a canned
+    response after `latency` seconds; the same prompt always yields the same
+    response. `token_delay` is spent between streamed pieces.
+    """
+
+    def __init__(self, latency=0.5, token_delay=0.005, recordings=None):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.recordings = load_recordings(recordings)
+
+    def respond(self, prompt):
+        """Return (response, latency) for a prompt, replaying a recording when there is one"""
+        recorded = self.recordings.get(prompt_key(prompt))
+        if recorded:
+            return recorded["response"], recorded["latency"]
+        return self.synthesize(prompt), self.latency
+
+    def synthesize(self, prompt):
+        """Build the canned response for a prompt"""
+        count = re.search(r"create (\d+) test cases", prompt)
+        lob = re.search(r"^LOB: (.+)$", prompt, re.MULTILINE)
+        region = re.search(r"^Region: (.+)$", prompt, re.MULTILINE)
+        count = int(count.group(1)) if count else 1
+        lob = lob.group(1).strip() if lob else "Retail"
+        region = region.group(1).strip() if region else "North America"
+        seed = prompt_key(prompt)[:8]
+        modules = ["Policy Issuance", "Claims Processing", "Billing", "Underwriting"]
+
+        blocks = [f"Here are {count} test cases:\n"]
+        for number in range(1, count + 1):
+            module = modules[(number - 1) % len(modules)]
+            blocks.append(
+                f"**Test Case {number}: {module} scenario {seed}-{number}**\n\n"
+                f"Sl No.: {number}\n"
+                f"Requirement ID: REQ-{number:03d}\n"
+                f"Test Case ID: TC-{number:03d}\n"
+                f"Module: {module}\n"
+                f"LOB: {lob}\n"
+                f"Region: {region}\n"
+                f"Test Case Description: Verify {module.lower()} scenario {seed}-{number} for {lob} in {region}\n"
+                f"Execution Steps:\n"
+                f"Step1: Open the {module} screen\n"
+                f"Step2: Enter the scenario {number} details\n"
+                f"Step3: Submit and review the outcome\n"
+                f"Expected Result: Scenario {seed}-{number} completes successfully\n"
+            )
+        return "\n".join(blocks)
+
+    def complete(self, prompt):
+        with tracing.span("llm", model="stub"):
+            text, latency = self.respond(prompt)
+            time.sleep(latency)
+            _record_estimate(prompt, text)
+            return text
+
+    def stream(self, prompt):
+        with tracing.span("llm", model="stub", stream=True) as current:
+            text, latency = self.respond(prompt)
+            time.sleep(latency)
+            current.set(time_to_first_token=latency)
+            for start in range(0, len(text), 16):
+                if self.token_delay:
+                    time.sleep(self.token_delay)
+                yield text[start:start + 16]
+            _record_estimate(prompt, text)
+
+    def open_async(self):
+        return _StubAsyncSession(self)
+
+    def close(self):
+        pass
+
+
+class _StubAsyncSession:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def complete(self, prompt):
+        with tracing.span("llm", model="stub"):
+            text, latency = self.backend.respond(prompt)
+            # A little jitter so concurrent shards finish out of order, as they do for real
+            await asyncio.sleep(latency * random.uniform(0.8, 1.2))
+            _record_estimate(prompt, text)
+            return text
+
+    async def close(self):
+        pass
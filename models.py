@@ -0,0 +1,159 @@
+# models.py
+import re
+
+import pandas as pd
+
+# Column name used in the UI and exports -> TestCase attribute
+COLUMNS = {
+    "Sl No.": "sl_no",
+    "Requirement ID": "requirement_id",
+    "Test Case ID": "test_case_id",
+    "Module": "module",
+    "LOB": "lob",
+    "Region": "region",
+    "Test Case Description": "description",
+    "Execution Steps": "steps",
+    "Expected Result": "expected_result",
+}
+
+# "Step1:", "Step 2 -", "**Step 3.**" ...
+STEP_LABEL = re.compile(r'(?:\*\*)?Step[ \t]*(\d+)[ \t]*[:.)\-](?:\*\*)?[ \t]*', re.IGNORECASE)
+# Leading bullet or "1." numbering on an unlabelled step line
+STEP_BULLET = re.compile(r'^[ \t]*(?:[-*•]|\d+[.)])[ \t]*')
+
+
+def split_steps(text):
+    """Split execution steps text into a list of step actions"""
+    labels = list(STEP_LABEL.finditer(text))
+    if labels:
+        ends = [label.start() for label in labels[1:]] + [len(text)]
+        steps = [text[label.end():end] for label, end in zip(labels, ends)]
+    else:
+        steps = [STEP_BULLET.sub("", line) for line in text.splitlines()]
+    return [" ".join(step.split()).strip("* ") for step in steps if step.strip()]
+
+
+class ExecutionStep:
+    """One numbered action in a test case."""
+
+    __slots__ = ("number", "action")
+
+    def __init__(self, number, action):
+        self.number = number
+        self.action = action
+
+    def __str__(self):
+        return f"Step {self.number}: {self.action}"
+
+    def __eq__(self, other):
+        return isinstance(other, ExecutionStep) and (self.number, self.action) == (other.number, other.action)
+
+    def __repr__(self):
+        return f"ExecutionStep({self.number!r}, {self.action!r})"
+
+
+class TestCase:
+    """A generated or test-bank test case; execution steps are kept as a list.
+
+    `novelty` (1 - similarity to the closest known case) is set by the dedup
+    stage and is not part of the exported columns.
+    """
+
+    __slots__ = tuple(COLUMNS.values()) + ("novelty",)
+
+    def __init__(self, sl_no="", requirement_id="", test_case_id="", module="", lob="", region="",
+                 description="", steps=(), expected_result="", novelty=None):
+        self.sl_no = sl_no
+        self.requirement_id = requirement_id
+        self.test_case_id = test_case_id
+        self.module = module
+        self.lob = lob
+        self.region = region
+        self.description = description
+        self.steps = [step if isinstance(step, ExecutionStep) else ExecutionStep(number, step)
+                      for number, step in enumerate(steps, 1)]
+        self.expected_result = expected_result
+        self.novelty = novelty
+
+    @property
+    def steps_text(self):
+        """Execution steps as text, with a blank line between steps."""
+        return "\n\n".join(str(step) for step in self.steps)
+
+    def copy(self):
+        return TestCase(self.sl_no, self.requirement_id, self.test_case_id, self.module, self.lob, self.region,
+                        self.description, [ExecutionStep(s.number, s.action) for s in self.steps],
+                        self.expected_result, self.novelty)
+
+    def to_dict(self):
+        """Column-name keyed dict, with execution steps rendered as text."""
+        row = {column: getattr(self, attr) for column, attr in COLUMNS.items()}
+        row["Execution Steps"] = self.steps_text
+        return row
+
+    @classmethod
+    def from_dict(cls, row):
+        """Build a TestCase from a column-name keyed dict (steps as text or a list)."""
+        steps = row.get("Execution Steps") or []
+        if isinstance(steps, str):
+            steps = split_steps(steps)
+        return cls(*(str(row.get(column) or "") for column in list(COLUMNS)[:7]), steps,
+                   str(row.get("Expected Result") or ""))
+
+    def __eq__(self, other):
+        return isinstance(other, TestCase) and all(
+            getattr(self, attr) == getattr(other, attr) for attr in COLUMNS.values()
+        )
+
+    def __repr__(self):
+        return f"TestCase({self.test_case_id!r}, {self.description!r})"
+
+
+def renumber(test_cases):
+    """Number Sl No. / Test Case ID sequentially, in place."""
+    for number, case in enumerate(test_cases, 1):
+        case.sl_no = str(number)
+        case.test_case_id = f"TC-{number:03d}"
+    return test_cases
+
+
+def cases_to_columns(test_cases, columns=COLUMNS):
+    """Column-name -> list of values, one pass per column with no per-row dicts."""
+    data = {}
+    for column in columns:
+        attr = COLUMNS[column]
+        if attr == "steps":
+            data[column] = [case.steps_text for case in test_cases]
+        else:
+            data[column] = [getattr(case, attr) for case in test_cases]
+    return data
+
+
+def cases_to_dataframe(test_cases, columns=COLUMNS):
+    """Columnar conversion of test cases to a DataFrame."""
+    return pd.DataFrame(cases_to_columns(test_cases, columns), columns=list(columns))
+
+
+def dataframe_to_cases(df):
+    """Build test cases from a DataFrame with the standard column names."""
+    values = [df[column].fillna("").astype(str).tolist() if column in df.columns else [""] * len(df)
+              for column in COLUMNS]
+    return [
+        TestCase(*row[:7], split_steps(row[7]), row[8])
+        for row in zip(*values)
+    ]
+
+
+def cases_to_arrow(test_cases):
+    """Columnar conversion to a pyarrow Table, with steps as a list<string> column."""
+    import pyarrow as pa
+
+    data = cases_to_columns(test_cases, [column for column in COLUMNS if column != "Execution Steps"])
+    data["Execution Steps"] = [[step.action for step in case.steps] for case in test_cases]
+    return pa.table(data)
+
+
+def arrow_to_cases(table):
+    """Build test cases from a pyarrow Table produced by cases_to_arrow."""
+    columns = [table.column(column).to_pylist() for column in COLUMNS]
+    return [TestCase(*row) for row in zip(*columns)]
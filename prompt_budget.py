@@ -0,0 +1,113 @@
+# prompt_budget.py
+import re
+
+from config import LLM_CONTEXT_TOKENS, OUTPUT_TOKENS_PER_CASE, PROMPT_SAFETY_TOKENS, REQUIREMENTS_SHARE
+from llm_backend import estimate_tokens
+
+# Start of each test bank example inside a retrieved chunk ("Test Case 12:")
+EXAMPLE_HEADER = re.compile(r"^Test Case [^\n:]*:[ \t]*\n", re.MULTILINE)
+OUTPUT_OVERHEAD_TOKENS = 100  # Preamble the model writes before the first case
+
+_encoding = None
+
+
+def count_tokens(text):
+    """Token count of `text`: exact with tiktoken installed, otherwise estimated from its length"""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def output_budget(num_test_cases):
+    """Tokens to leave free for the response to `num_test_cases` cases"""
+    return OUTPUT_OVERHEAD_TOKENS + OUTPUT_TOKENS_PER_CASE * num_test_cases
+
+
+def input_budget(num_test_cases, context_tokens=LLM_CONTEXT_TOKENS):
+    """Tokens the prompt may use so the response still fits in the context window"""
+    return context_tokens - output_budget(num_test_cases) - PROMPT_SAFETY_TOKENS
+
+
+def split_examples(context):
+    """Retrieved chunks as individual examples, with exact repeats removed.
+
+    Test bank rows often differ only in their number, so examples are
+    compared without their "Test Case N:" header.
+    """
+    examples = []
+    seen = set()
+    for block in EXAMPLE_HEADER.split(context):
+        body = block.strip()
+        signature = " ".join(body.lower().split())
+        if body and signature not in seen:
+            seen.add(signature)
+            examples.append(body)
+    return examples
+
+
+def fit_examples(examples, budget):
+    """As many whole examples as fit in `budget` tokens, in order of relevance"""
+    kept = []
+    used = 0
+    for example in examples:
+        tokens = count_tokens(example) + 1
+        if used + tokens > budget:
+            break
+        kept.append(example)
+        used += tokens
+    return kept
+
+
+def compress_requirements(text, budget):
+    """Fit requirements into `budget` tokens.
+
+    Whitespace is collapsed and repeated lines dropped first; if that is not
+    enough, whole lines are kept from the top and the rest is cut with a note.
+    """
+    lines = []
+    seen = set()
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if line and line.lower() not in seen:
+            seen.add(line.lower())
+            lines.append(line)
+    compressed = "\n".join(lines)
+    if count_tokens(compressed) <= budget:
+        return compressed
+
+    kept = []
+    used = 0
+    for line in lines:
+        tokens = count_tokens(line) + 1
+        if used + tokens > budget:
+            break
+        kept.append(line)
+        used += tokens
+    if not kept and lines:
+        # A single huge line: keep as many characters as the budget allows
+        kept.append(lines[0][:max(0, budget) * 4])
+    dropped = len(lines) - len(kept)
+    if dropped:
+        kept.append(f"[... {dropped} more requirement lines omitted to fit the context window]")
+    return "\n".join(kept)
+
+
+def allocate(available, requirement_tokens, example_tokens):
+    """Split the free prompt tokens between requirements and examples.
+
+    Requirements get up to REQUIREMENTS_SHARE of the space when both need
+    more than there is; whatever one side does not use goes to the other.
+    """
+    available = max(0, available)
+    if requirement_tokens + example_tokens <= available:
+        return requirement_tokens, example_tokens
+    requirement_budget = max(int(available * REQUIREMENTS_SHARE), available - example_tokens)
+    requirement_budget = min(requirement_budget, requirement_tokens)
+    return requirement_budget, available - requirement_budget
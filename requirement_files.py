@@ -0,0 +1,254 @@
+# requirement_files.py
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from docx import Document
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+TXT_TYPE = "text/plain"
+CSV_TYPE = "text/csv"
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+EXTENSION_TYPES = {".txt": TXT_TYPE, ".csv": CSV_TYPE, ".docx": DOCX_TYPE}
+
+# Line that starts an acceptance criterion: "[REQ 7]", "AC-3:", "Scenario 2: ...", "- ...", "4. ..."
+CRITERION_START = re.compile(
+    r"^(?:\[(?P<bracket_id>[^\]\n]{1,30})\][ \t]*"
+    r"|(?P<id>(?!step)[A-Za-z]{1,6}[-_]?\d+(?:[.-]\d+)*)[ \t]*[:)\-\u2013][ \t]*"
+    r"|(?=Scenario(?: Outline)?\b[^:\n]*:)"
+    r"|(?:[-*\u2022]|\d+[.)])[ \t]+)",
+    re.IGNORECASE,
+)
+# Section heading such as "Acceptance Criteria:" or "Notes for Testing:"
+HEADING = re.compile(r"^[^.!?:\n]{1,40}:$")
+# Column of a requirements CSV holding each row's identifier
+CSV_ID_COLUMNS = {"id", "requirement id", "req id", "ac id", "criterion id", "criteria id"}
+CSV_READ_ROWS = 10_000  # Rows parsed at a time from large CSV uploads
+PARSE_CACHE_SIZE = 16  # Parsed uploads kept in memory
+
+_parsed = OrderedDict()
+_parsed_lock = threading.Lock()
+
+def _record_line(record_id, fields):
+    """One record (CSV or Word table row) as a single criterion line"""
+    text = "; ".join(f"{name}: {' '.join(value.split())}" for name, value in fields if value and value.strip())
+    if record_id and record_id.strip():
+        return f"[{record_id.strip()}] {text}"
+    return f"- {text}" if text else None
+
+def _id_column(columns):
+    return next((index for index, column in enumerate(columns) if str(column).strip().lower() in CSV_ID_COLUMNS), None)
+
+def _csv_lines(file):
+    """Stream a CSV a block of rows at a time, one line per row"""
+    for rows in pd.read_csv(file, chunksize=CSV_READ_ROWS, dtype=str, keep_default_na=False):
+        columns = list(rows.columns)
+        id_index = _id_column(columns)
+        # Plain column lists are much faster to walk than DataFrame rows
+        for values in zip(*(rows[column].tolist() for column in columns)):
+            line = _record_line(values[id_index] if id_index is not None else None,
+                                [(column, value) for index, (column, value) in enumerate(zip(columns, values))
+                                 if index != id_index])
+            if line:
+                yield line
+
+def _table_lines(table):
+    """A Word table: rows under a header row become records, anything else one line per row"""
+    rows = []
+    for row in table.rows:
+        cells = []
+        for cell in row.cells:
+            # Merged cells repeat the same cell object
+            if not cells or cell._tc is not cells[-1][0]:
+                cells.append((cell._tc, " ".join(cell.text.split())))
+        rows.append([text for _, text in cells])
+    if not rows:
+        return
+    header = rows[0]
+    if len(rows) > 1 and len(header) > 1 and all(header) and all(len(name) <= 40 for name in header):
+        id_index = _id_column(header)
+        for values in rows[1:]:
+            line = _record_line(values[id_index] if id_index is not None and id_index < len(values) else None,
+                                [(name, value) for index, (name, value) in enumerate(zip(header, values))
+                                 if index != id_index])
+            if line:
+                yield line
+    else:
+        for values in rows:
+            if any(values):
+                yield " | ".join(value for value in values if value)
+
+def _docx_lines(file):
+    """Paragraphs and tables of a Word document in document order"""
+    document = Document(file)
+    for element in document.element.body.iterchildren():
+        if element.tag == qn("w:p"):
+            paragraph = Paragraph(element, document)
+            text = paragraph.text
+            # Word list numbering is not part of the text, so mark list items explicitly
+            properties = element.pPr
+            if text.strip() and ((properties is not None and properties.numPr is not None)
+                                 or paragraph.style.name.startswith("List")):
+                text = "- " + text
+            yield text
+        elif element.tag == qn("w:tbl"):
+            yield ""
+            yield from _table_lines(Table(element, document))
+            yield ""
+
+def _text_lines(file):
+    """Stream a text file line by line"""
+    for line in file:
+        yield line.decode("utf-8", errors="replace")
+
+def _lines(file, file_type):
+    if file_type == TXT_TYPE:
+        return _text_lines(file)
+    elif file_type == CSV_TYPE:
+        return _csv_lines(file)
+    elif file_type == DOCX_TYPE:
+        return _docx_lines(file)
+    raise ValueError(f"Unsupported requirement file type: {file_type}")
+
+def file_digest(file):
+    """SHA-256 of a file object's content, read in blocks"""
+    file.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: file.read(1 << 20), b""):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+def compact_text(parts):
+    """Requirements in document order, with each criterion on one "[ID] criterion" line.
+
+    Story text and headings stay where they were, with blank lines between
+    paragraphs; splitting this text again gives back the same preamble,
+    criteria and IDs.
+    """
+    lines = []
+    after_criterion = False
+    for part in parts:
+        if isinstance(part, dict):
+            lines.append(f"[{part['id']}] {' '.join(part['text'].split())}")
+            after_criterion = True
+            continue
+        if part and after_criterion:
+            # A criterion takes in the line right after it, so text that follows one is set apart
+            lines.append("")
+        if part or (lines and lines[-1]):
+            lines.append(part)
+        after_criterion = False
+    return "\n".join(lines).strip()
+
+def parse_requirements(file, file_type=None):
+    """Parse a requirement file once per content: {"text", "preamble", "criteria"}.
+
+    Results are memoized by content hash, so Streamlit reruns with the same
+    upload do not parse it again.
+    """
+    file_type = file_type or file.type
+    key = (file_digest(file), file_type)
+    with _parsed_lock:
+        if key in _parsed:
+            _parsed.move_to_end(key)
+            return _parsed[key]
+    parts = _split_lines(_lines(file, file_type))
+    parts = [{**part, "text": " ".join(part["text"].split())} if isinstance(part, dict) else part for part in parts]
+    criteria = [part for part in parts if isinstance(part, dict)]
+    parsed = {"text": compact_text(parts), "preamble": _preamble(parts), "criteria": criteria}
+    with _parsed_lock:
+        _parsed[key] = parsed
+        while len(_parsed) > PARSE_CACHE_SIZE:
+            _parsed.popitem(last=False)
+    return parsed
+
+def extract_text(file, file_type=None):
+    """Extract requirement text from a binary file object such as a Streamlit upload"""
+    return parse_requirements(file, file_type)["text"]
+
+def extract_text_from_path(path):
+    """Extract requirement text from a txt/csv/docx file on disk"""
+    file_type = EXTENSION_TYPES.get(os.path.splitext(path)[1].lower())
+    if file_type is None:
+        raise ValueError(f"Unsupported requirement file: {path}")
+    with open(path, "rb") as file:
+        return extract_text(file, file_type)
+
+def find_requirement_files(directory):
+    """Sorted paths of every supported requirement file under a directory"""
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in EXTENSION_TYPES:
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+def split_criteria(text):
+    """Split a requirements document into individually testable acceptance criteria.
+
+    Returns (preamble, criteria): the story text and headings outside the
+    criteria, in document order, and a list of {"id", "text", "section"}
+    dicts, where section is the heading the criterion sits under. Only
+    explicitly marked lines start a criterion: numbered, bulleted,
+    "Scenario ..." or ID-prefixed ones. A criterion runs until a blank line,
+    a heading or the next criterion; explicit IDs are kept, others are
+    numbered AC-01, AC-02, ... Plain prose without such markers has no
+    criteria.
+    """
+    parts = _split_lines(text.splitlines())
+    return _preamble(parts), [part for part in parts if isinstance(part, dict)]
+
+def _preamble(parts):
+    return "\n".join(part for part in parts if isinstance(part, str) and part)
+
+def _split_lines(lines):
+    """The document as parts in order: story and heading lines as strings ("" between paragraphs), criteria as dicts"""
+    parts = []
+    current = None
+    section = ""
+    for raw_line in lines:
+        line = " ".join(raw_line.split())
+        if not line:
+            current = None
+            if parts and parts[-1] != "":
+                parts.append("")
+            continue
+        start = CRITERION_START.match(line)
+        if start:
+            current = {"id": start.group("bracket_id") or start.group("id"), "lines": [line[start.end():]],
+                       "section": section}
+            parts.append(current)
+        elif HEADING.match(line):
+            # A heading ends the criterion before it, but stays in the text as context for those after it
+            current = None
+            section = line
+            parts.append(line)
+        elif current is not None:
+            current["lines"].append(line)
+        else:
+            # Text outside any criterion describes the story
+            parts.append(line)
+
+    numbered = []
+    used = set()
+    for part in parts:
+        if not isinstance(part, dict):
+            numbered.append(part)
+            continue
+        body = "\n".join(part["lines"]).strip()
+        if not body:
+            continue
+        criterion_id = part["id"].strip() if part["id"] else None
+        number = len(used) + 1
+        while not criterion_id or criterion_id in used:
+            criterion_id = f"AC-{number:02d}"
+            number += 1
+        used.add(criterion_id)
+        numbered.append({"id": criterion_id, "text": body, "section": part["section"]})
+    return numbered
@@ -0,0 +1,233 @@
+# resources.py
+import atexit
+import threading
+
+import httpx
+from groq import Groq
+from langchain_huggingface import HuggingFaceEmbeddings
+from config import (
+    GROQ_API_KEY, EMBEDDING_MODEL_NAME, EMBEDDING_MAX_TOKENS, CHROMA_DB_PATH, LLM_BACKEND, LLM_MODEL, LLM_FALLBACK_MODELS,
+    LLM_MAX_RETRIES, LLM_TIMEOUT, LLM_CONNECT_TIMEOUT, LLM_POOL_SIZE, LLM_RECORDINGS_PATH, STUB_LATENCY,
+    RESPONSE_CACHE_PATH, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_SIMILARITY,
+    RETRIEVAL_MODE, RERANK_MODEL, VECTOR_STORE, VECTOR_INDEX_PATH,
+    EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_MAX_MB, TEST_BANK_DB_PATH,
+)
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from llm_backend import GroqBackend, RecordingBackend, StubBackend, http_limits, http_timeout
+from response_cache import ResponseCache
+from retriever import HybridRetriever
+from test_bank import TestBank
+from vector_index import MmapVectorStore
+
+# Streamlit re-runs the app script on every widget interaction, but imported
+# modules live for the whole server process. Keeping the heavy objects here
+# means they are built once and shared by every session and rerun.
+_lock = threading.RLock()
+_resources = {}
+
+
+def _get_or_create(name, factory):
+    """Return the cached resource `name`, building it with `factory` on first use."""
+    resource = _resources.get(name)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(name)
+            if resource is None:
+                resource = factory()
+                _resources[name] = resource
+    return resource
+
+
+def get_embedding_cache():
+    """Return the shared persistent embedding cache, or None when disabled."""
+    if not EMBEDDING_CACHE_PATH:
+        return None
+    return _get_or_create(
+        "embedding_cache",
+        lambda: EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_MODEL_NAME, max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+                               max_bytes=EMBEDDING_CACHE_MAX_MB * 2 ** 20),
+    )
+
+
+def get_embedding_model():
+    """Return the shared HuggingFace embedding model itself, bypassing the embedding cache."""
+    return _get_or_create("embedding_model", lambda: HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME))
+
+
+def count_embedding_tokens(text):
+    """Tokens the embedding model's own tokenizer makes of `text`, before any truncation."""
+    tokenizer = get_embedding_model().client.tokenizer
+    return len(tokenizer(text, truncation=False)["input_ids"])
+
+
+def get_embeddings():
+    """Return the shared embedding model, behind the embedding cache when enabled."""
+    def factory():
+        cache = get_embedding_cache()
+        return get_embedding_model() if cache is None else CachedEmbeddings(get_embedding_model(), cache)
+    return _get_or_create("embeddings", factory)
+
+
+def get_chroma():
+    """Return the shared Chroma store, which ingestion writes to."""
+    def factory():
+        # Imported here so processes serving the memory-mapped index never load Chroma
+        from langchain_chroma import Chroma
+        return Chroma(persist_directory=CHROMA_DB_PATH, embedding_function=get_embeddings())
+    return _get_or_create("chroma", factory)
+
+
+def get_vector_db():
+    """Return the shared vector store queried at run time: Chroma, or the memory-mapped index built from it."""
+    if VECTOR_STORE == "mmap":
+        return _get_or_create("vector_db", lambda: MmapVectorStore(VECTOR_INDEX_PATH, get_embeddings()))
+    return _get_or_create("vector_db", get_chroma)
+
+
+def get_reranker():
+    """Return the shared cross-encoder used to rerank retrieval candidates, or None when disabled."""
+    if not RERANK_MODEL:
+        return None
+
+    def factory():
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(RERANK_MODEL, device="cpu")
+    return _get_or_create("reranker", factory)
+
+
+def get_retriever():
+    """Return the shared hybrid BM25 + vector retriever."""
+    return _get_or_create(
+        "retriever",
+        lambda: HybridRetriever(get_vector_db(), get_embeddings(), reranker=get_reranker()),
+    )
+
+
+def get_groq_client():
+    """Return the shared Groq client, with a pooled keep-alive connection and timeouts."""
+    return _get_or_create("groq_client", lambda: Groq(
+        api_key=GROQ_API_KEY,
+        timeout=http_timeout(LLM_TIMEOUT, LLM_CONNECT_TIMEOUT),
+        http_client=httpx.Client(limits=http_limits(LLM_POOL_SIZE)),
+    ))
+
+
+def get_llm_backend():
+    """Return the shared LLM backend selected by LLM_BACKEND."""
+    def factory():
+        if LLM_BACKEND == "stub":
+            return StubBackend(latency=STUB_LATENCY, recordings=LLM_RECORDINGS_PATH)
+        backend = GroqBackend(
+            get_groq_client(), GROQ_API_KEY, LLM_MODEL, fallback_models=LLM_FALLBACK_MODELS,
+            max_retries=LLM_MAX_RETRIES, timeout=LLM_TIMEOUT, connect_timeout=LLM_CONNECT_TIMEOUT,
+            pool_size=LLM_POOL_SIZE,
+        )
+        if LLM_BACKEND == "record":
+            return RecordingBackend(backend, LLM_RECORDINGS_PATH)
+        return backend
+    return _get_or_create("llm_backend", factory)
+
+
+def get_response_cache():
+    """Return the shared persistent response cache."""
+    return _get_or_create(
+        "response_cache",
+        lambda: ResponseCache(
+            RESPONSE_CACHE_PATH,
+            ttl=RESPONSE_CACHE_TTL,
+            max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+            similarity_threshold=RESPONSE_CACHE_SIMILARITY,
+            embed=lambda text: get_embeddings().embed_query(text),
+            model=LLM_MODEL,
+            count_tokens=count_embedding_tokens,
+            max_embed_tokens=EMBEDDING_MAX_TOKENS,
+        ),
+    )
+
+
+def get_test_bank():
+    """Return the shared managed test bank store."""
+    return _get_or_create("test_bank", lambda: TestBank(TEST_BANK_DB_PATH))
+
+
+def warmup():
+    """Load every resource up front so the first generation does not pay for it."""
+    get_embeddings().embed_query("warmup")
+    get_vector_db()
+    if RETRIEVAL_MODE == "hybrid":
+        get_retriever().bm25()
+    get_llm_backend()
+    get_response_cache()
+
+
+def health_check():
+    """Report the state of each resource without loading anything new."""
+    status = {}
+    embeddings = _resources.get("embeddings")
+    status["embeddings"] = "loaded" if embeddings is not None else "not loaded"
+
+    vector_db = _resources.get("vector_db")
+    if vector_db is None:
+        status["vector_db"] = "not loaded"
+    else:
+        try:
+            status["vector_db"] = f"ok ({vector_db._collection.count()} chunks)"
+        except Exception as e:
+            status["vector_db"] = f"error: {e}"
+
+    llm_backend = _resources.get("llm_backend")
+    if llm_backend is None:
+        status["llm_backend"] = "not loaded"
+    elif LLM_BACKEND != "stub" and not GROQ_API_KEY:
+        status["llm_backend"] = "error: GROQ_API_KEY is not set"
+    else:
+        status["llm_backend"] = f"ok ({type(llm_backend).__name__})"
+
+    response_cache = _resources.get("response_cache")
+    if response_cache is None:
+        status["response_cache"] = "not loaded"
+    else:
+        stats = response_cache.stats()
+        status["response_cache"] = f"ok ({stats['entries']} entries, {stats['hit_rate']:.0%} hit rate)"
+
+    embedding_cache = _resources.get("embedding_cache")
+    if embedding_cache is None:
+        status["embedding_cache"] = "not loaded"
+    else:
+        stats = embedding_cache.stats()
+        status["embedding_cache"] = (f"ok ({stats['entries']} entries, {stats['megabytes']} MB, "
+                                     f"{stats['hit_rate']:.0%} hit rate)")
+
+    test_bank = _resources.get("test_bank")
+    if test_bank is None:
+        status["test_bank"] = "not loaded"
+    else:
+        try:
+            status["test_bank"] = f"ok ({test_bank.count()} cases)"
+        except Exception as e:
+            status["test_bank"] = f"error: {e}"
+
+    status["healthy"] = all(not value.startswith("error") for value in status.values())
+    return status
+
+
+def teardown():
+    """Release every cached resource; the next access rebuilds it."""
+    with _lock:
+        _resources.pop("llm_backend", None)
+        groq_client = _resources.pop("groq_client", None)
+        if groq_client is not None:
+            groq_client.close()
+        response_cache = _resources.pop("response_cache", None)
+        if response_cache is not None:
+            response_cache.close()
+        embedding_cache = _resources.pop("embedding_cache", None)
+        if embedding_cache is not None:
+            embedding_cache.close()
+        test_bank = _resources.pop("test_bank", None)
+        if test_bank is not None:
+            test_bank.close()
+        _resources.clear()
+
+
+atexit.register(teardown)
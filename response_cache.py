@@ -0,0 +1,171 @@
+# response_cache.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+def normalize_requirements(text):
+    """Collapse whitespace and case so trivially different inputs share a key."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class ResponseCache:
+    """Persistent SQLite cache of raw LLM responses for generation requests.
+
+    Entries are looked up by an exact key over the sidebar selections, the
+    normalized requirements and the case count. When `similarity_threshold` is
+    set and an `embed` function is given, a request with the same selections
+    whose requirements embed within that cosine similarity of a cached entry is
+    also served from the cache. Only requirements the embedding model reads in
+    full (`count_tokens` of them within `max_embed_tokens`) take part, since
+    texts differing past its truncation point embed alike; longer ones use the
+    exact key alone. Keys include `model`, so another LLM never gets this one's
+    responses. Entries older than `ttl` seconds are ignored and the least
+    recently used ones are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, path, ttl=None, max_entries=1000, similarity_threshold=None, embed=None, model="",
+                 count_tokens=None, max_embed_tokens=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed
+        self.model = model
+        self.count_tokens = count_tokens
+        self.max_embed_tokens = max_embed_tokens
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                selection_key TEXT NOT NULL,
+                embedding BLOB,
+                raw_response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_selection ON responses (selection_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses (last_used)")
+        self._conn.commit()
+
+    def _selection_key(self, insurance_type, region, line_of_business, num_test_cases):
+        return json.dumps([self.model, insurance_type, region, line_of_business, int(num_test_cases)])
+
+    def _key(self, selection_key, requirements):
+        payload = selection_key + "\n" + normalize_requirements(requirements)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _embedding(self, requirements):
+        if self.similarity_threshold is None or self.embed is None:
+            return None
+        text = normalize_requirements(requirements)
+        if self.max_embed_tokens and self.count_tokens and self.count_tokens(text) > self.max_embed_tokens:
+            return None
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _fresh_after(self):
+        return time.time() - self.ttl if self.ttl else 0.0
+
+    def get(self, insurance_type, region, line_of_business, requirements, num_test_cases, similar=True):
+        """Return the cached raw response for this request, or None; `similar=False` skips the similarity match."""
+        selection_key = self._selection_key(insurance_type, region, line_of_business, num_test_cases)
+        key = self._key(selection_key, requirements)
+        fresh_after = self._fresh_after()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT raw_response FROM responses WHERE key = ? AND created_at >= ?", (key, fresh_after)
+            ).fetchone()
+            if row:
+                self.hits += 1
+                self._touch(key)
+                return row[0]
+
+        query = self._embedding(requirements) if similar else None
+        if query is not None:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT key, embedding, raw_response FROM responses "
+                    "WHERE selection_key = ? AND created_at >= ? AND embedding IS NOT NULL",
+                    (selection_key, fresh_after),
+                ).fetchall()
+                if rows:
+                    matrix = np.frombuffer(b"".join(r[1] for r in rows), dtype=np.float32).reshape(len(rows), -1)
+                    scores = matrix @ query
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity_threshold:
+                        self.similar_hits += 1
+                        self._touch(rows[best][0])
+                        return rows[best][2]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, insurance_type, region, line_of_business, requirements, num_test_cases, raw_response,
+            similar=True):
+        """Store a raw response and evict the oldest entries beyond the size cap.
+
+        With `similar=False` no embedding is stored, so only an exact request finds the entry.
+        """
+        selection_key = self._selection_key(insurance_type, region, line_of_business, num_test_cases)
+        key = self._key(selection_key, requirements)
+        embedding = self._embedding(requirements) if similar else None
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, selection_key, embedding.tobytes() if embedding is not None else None, raw_response, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _touch(self, key):
+        self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+
+    def _evict(self):
+        if self.ttl:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (self._fresh_after(),))
+        if self.max_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        """Drop every cached response."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters for this process and the current entry count."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.similar_hits) / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
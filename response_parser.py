@@ -1,76 +1,135 @@
 # response_parser.py
 import re
 
-import streamlit as st
-def clean_ai_response(response):
-    """Improved parser to handle variable numbers of execution steps"""
+from models import COLUMNS, TestCase, split_steps
+
+FIELDS = list(COLUMNS)
+# Fields whose value may run over several lines; the others stop at the end of their line
+MULTILINE_FIELDS = {"Execution Steps", "Expected Result"}
+
+# "**Test Case 3: ...", "## Test Case 3: ..." or "Test Case 3: ..." at the start of a line
+CASE_HEADER = re.compile(r'^[ \t]*(?:\*\*|#+[ \t]*)?Test Case[ \t]*\d+[ \t]*:', re.MULTILINE)
+# Any field label, optionally bulleted and/or bold ("- **Module:** ...", "Sl No: ...")
+FIELD_LABEL = re.compile(
+    r'^[ \t]*(?:[-*•][ \t]+)?(?:\*\*)?'
+    r'(Sl No\.?|Requirement ID|Test Case ID|Module|LOB|Region|Test Case Description|Execution Steps|Expected Result)'
+    r'(?:\*\*)?[ \t]*:(?:\*\*)?[ \t]*',
+    re.MULTILINE | re.IGNORECASE,
+)
+SL_NO_DIGITS = re.compile(r'\d+')
+
+_CANONICAL_LABELS = {field.lower().rstrip("."): field for field in FIELDS}
+
+
+def parse_block(block):
+    """Parse one test case block in a single scan over its field labels.
+
+    Returns (case, missing) where `case` is a TestCase, or None if any field
+    is missing, and `missing` lists the fields that were not found.
+    """
+    values = dict.fromkeys(FIELDS, "")
+    labels = list(FIELD_LABEL.finditer(block))
+    for index, label in enumerate(labels):
+        field = _CANONICAL_LABELS[label.group(1).lower().rstrip(".")]
+        if values[field]:
+            continue  # Keep the first occurrence of a field
+        end = labels[index + 1].start() if index + 1 < len(labels) else len(block)
+        value = block[label.end():end]
+        if field == "Execution Steps":
+            values[field] = split_steps(value)
+            continue
+        if field not in MULTILINE_FIELDS:
+            value = value.split("\n", 1)[0]
+        value = value.strip().strip("*").strip()
+        if field == "Sl No.":
+            digits = SL_NO_DIGITS.search(value)
+            value = digits.group(0) if digits else ""
+        values[field] = value
+
+    missing = [field for field in FIELDS if not values[field]]
+    if missing:
+        return None, missing
+    return TestCase(*values.values()), missing
+
+
+def parse_response(response):
+    """Parse a full LLM response.
+
+    Returns (test_cases, diagnostics), where each diagnostic is a dict with the
+    block's position, the fields that were missing and the raw block text.
+    """
     test_cases = []
-    
-    # Split into test case blocks using numbered headers
-    case_blocks = re.split(r'\n\*\*Test Case \d+:', response)
-    
-    for block in case_blocks[1:]:  # Skip first empty split
-        current_case = {
-            "Sl No.": "",
-            "Requirement ID": "",
-            "Test Case ID": "",
-            "Module": "",
-            "LOB": "",
-            "Region": "",
-            "Test Case Description": "",
-            "Execution Steps": "",
-            "Expected Result": ""
-        }
-        
-        # Extract fields using regex
-        sl_no_match = re.search(r'Sl No\.:\s*(\d+)', block)
-        if sl_no_match:
-            current_case["Sl No."] = sl_no_match.group(1).strip()
-        
-        req_id_match = re.search(r'Requirement ID:\s*([^\n]+)', block)
-        if req_id_match:
-            current_case["Requirement ID"] = req_id_match.group(1).strip()
-        
-        tc_id_match = re.search(r'Test Case ID:\s*([^\n]+)', block)
-        if tc_id_match:
-            current_case["Test Case ID"] = tc_id_match.group(1).strip()
-        
-        module_match = re.search(r'Module:\s*([^\n]+)', block)
-        if module_match:
-            current_case["Module"] = module_match.group(1).strip()
-        
-        lob_match = re.search(r'LOB:\s*([^\n]+)', block)
-        if lob_match:
-            current_case["LOB"] = lob_match.group(1).strip()
-        
-        region_match = re.search(r'Region:\s*([^\n]+)', block)
-        if region_match:
-            current_case["Region"] = region_match.group(1).strip()
-        
-        desc_match = re.search(r'Test Case Description:\s*([^\n]+)', block)
-        if desc_match:
-            current_case["Test Case Description"] = desc_match.group(1).strip()
-        
-        # Extract execution steps dynamically
-        steps_match = re.search(r'Execution Steps:\s*(.*?)(?=\nExpected Result:)', block, re.DOTALL)
-        if steps_match:
-            steps = steps_match.group(1).strip()
-            # Ensure each step is on a new line with a gap line between steps
-            steps = re.sub(r'Step(\d+):', r'\nStep\1:', steps)  # Add newline before each step
-            steps = steps.replace('\n', '\n\n')  # Add an extra newline to create a gap
-            steps = steps.strip()  # Remove leading/trailing whitespace
-            current_case["Execution Steps"] = steps
-        
-        # Extract expected result
-        result_match = re.search(r'Expected Result:\s*(.*)', block, re.DOTALL)
-        if result_match:
-            current_case["Expected Result"] = result_match.group(1).strip()
-        
-        # Add only if all required fields are present
-        if all(current_case.values()):
+    diagnostics = []
+    headers = list(CASE_HEADER.finditer(response))
+    for index, header in enumerate(headers):
+        end = headers[index + 1].start() if index + 1 < len(headers) else len(response)
+        block = response[header.end():end]
+        current_case, missing = parse_block(block)
+        if current_case:
             test_cases.append(current_case)
         else:
-            # Debugging: Print the block that failed to parse
-            st.warning(f"Failed to parse block: {block}")
-    
-    return test_cases
\ No newline at end of file
+            diagnostics.append({"block": index + 1, "missing": missing, "text": block})
+    return test_cases, diagnostics
+
+
+def clean_ai_response(response):
+    """Parse a full LLM response into test cases, dropping blocks that are incomplete"""
+    return parse_response(response)[0]
+
+
+def format_diagnostic(diagnostic):
+    """One-line description of a block that failed to parse, or of a suite short of the requested cases"""
+    if "requested" in diagnostic:
+        dropped = f" ({diagnostic['duplicates']} near-duplicates dropped)" if diagnostic["duplicates"] else ""
+        return f"Returned {diagnostic['returned']} of {diagnostic['requested']} requested test cases{dropped}"
+    return f"Failed to parse test case block {diagnostic['block']} (missing: {', '.join(diagnostic['missing'])})"
+
+
+class IncrementalParser:
+    """Parse a streamed response, emitting each test case as soon as it is complete.
+
+    A case is complete when the next `**Test Case N:**` header arrives or the
+    stream ends; an Expected Result may run over several paragraphs, so a
+    blank line does not end it. Blocks are cut exactly as parse_response cuts
+    them, so both return the same cases. Blocks that cannot be parsed are
+    reported in `diagnostics`.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._blocks_seen = 0
+        self.diagnostics = []
+
+    def _emit(self, block, completed):
+        self._blocks_seen += 1
+        current_case, missing = parse_block(block)
+        if current_case:
+            completed.append(current_case)
+        else:
+            self.diagnostics.append({"block": self._blocks_seen, "missing": missing, "text": block})
+
+    def feed(self, text):
+        """Add streamed text and return the test cases it completed"""
+        self._buffer += text
+        completed = []
+        while True:
+            header = CASE_HEADER.search(self._buffer)
+            if not header:
+                return completed
+            next_header = CASE_HEADER.search(self._buffer, header.end())
+            if next_header:
+                self._emit(self._buffer[header.end():next_header.start()], completed)
+                self._buffer = self._buffer[next_header.start():]
+                continue
+            # Drop any preamble and keep only the block still being streamed
+            self._buffer = self._buffer[header.start():]
+            return completed
+
+    def finish(self):
+        """Flush the final block once the stream has ended"""
+        completed = []
+        header = CASE_HEADER.search(self._buffer)
+        if header:
+            self._emit(self._buffer[header.end():], completed)
+        self._buffer = ""
+        return completed
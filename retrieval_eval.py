@@ -0,0 +1,158 @@
+# retrieval_eval.py
+import argparse
+import json
+import time
+
+import numpy as np
+
+from config import TEST_BANK_PATH, CHUNK_SIZE, CHUNK_MAX_TOKENS, RETRIEVAL_K
+from ingestion import CHUNK_STRATEGIES, iter_chunks
+from prompt_budget import count_tokens
+from resources import get_embedding_model
+from test_bank import read_bank
+
+K_VALUES = [1, RETRIEVAL_K, 10]
+# Paraphrased queries labelled against the rows of test.csv. Queries copied from the bank's own text
+# (descriptions, expected results) match their rows verbatim and score every strategy perfectly
+QUERIES_PATH = "retrieval_queries.jsonl"
+
+
+def load_queries(path=QUERIES_PATH):
+    """Queries from a JSONL file of {"query": ..., "relevant": [row keys]}"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def labelled_in(queries, source):
+    """The queries with at least one relevant row in the bank; the others cannot be scored"""
+    row_keys = {key for rows in read_bank(source) for key in rows["Row Key"]}
+    kept = [query for query in queries if row_keys.intersection(query["relevant"])]
+    if not kept:
+        raise ValueError(f"None of the queries' relevant rows are in {source}")
+    if len(kept) < len(queries):
+        print(f"Skipping {len(queries) - len(kept)} queries whose relevant rows are not in {source}")
+    return kept
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+
+def evaluate(strategy, queries, query_vectors, embeddings, source=TEST_BANK_PATH, k_values=K_VALUES, repeat=5,
+             chunk_size=CHUNK_SIZE, max_tokens=CHUNK_MAX_TOKENS):
+    """Index the bank with one chunking strategy and score exact vector search over it.
+
+    Recall@k is the share of a query's relevant rows found in the top k
+    chunks and precision@k the share of rows in those chunks that are
+    relevant, both averaged over queries; MRR uses the first chunk holding
+    a relevant row. Latency is the search alone (the query embeddings are
+    shared by every strategy), timed over `repeat` passes.
+    """
+    if repeat < 1:
+        raise ValueError(f"repeat must be at least 1, got {repeat}")
+    chunks = list(iter_chunks(source, chunk_size, strategy=strategy, max_tokens=max_tokens))
+    start = time.perf_counter()
+    vectors = _normalize(embeddings.embed_documents([chunk["text"] for chunk in chunks]))
+    embed_seconds = time.perf_counter() - start
+    chunk_rows = [set(chunk["rows"].split(",")) for chunk in chunks]
+    max_k = min(max(k_values), len(chunks))
+
+    times = []
+    for _ in range(repeat):
+        rankings = []
+        for query_vector in query_vectors:
+            start = time.perf_counter()
+            scores = vectors @ query_vector
+            top = np.argpartition(-scores, max_k - 1)[:max_k]
+            rankings.append(top[np.argsort(-scores[top])])
+            times.append(time.perf_counter() - start)
+
+    recall = {k: [] for k in k_values}
+    precision = {k: [] for k in k_values}
+    reciprocal_ranks = []
+    for query, ranking in zip(queries, rankings):
+        relevant = set(query["relevant"])
+        hits = [len(chunk_rows[position] & relevant) for position in ranking]
+        sizes = [len(chunk_rows[position]) for position in ranking]
+        for k in k_values:
+            recall[k].append(sum(hits[:k]) / max(len(relevant), 1))
+            precision[k].append(sum(hits[:k]) / max(sum(sizes[:k]), 1))
+        reciprocal_ranks.append(next((1 / rank for rank, hit in enumerate(hits, 1) if hit), 0.0))
+
+    p50_ms = float(np.percentile(times, 50)) * 1000
+    result = {
+        "strategy": strategy,
+        "queries": len(queries),
+        "vectors": len(chunks),
+        "rows_per_chunk": round(float(np.mean([len(rows) for rows in chunk_rows])), 2),
+        "tokens_per_chunk": round(float(np.mean([count_tokens(chunk["text"]) for chunk in chunks])), 1),
+        "embed_seconds": round(embed_seconds, 3),
+        **{f"recall@{k}": round(float(np.mean(recall[k])), 4) for k in k_values},
+        **{f"precision@{k}": round(float(np.mean(precision[k])), 4) for k in k_values},
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+        "p50_ms": round(p50_ms, 4),
+        "p95_ms": round(float(np.percentile(times, 95)) * 1000, 4),
+    }
+    # Quality per millisecond of search and per thousand stored vectors, to compare layouts on cost
+    quality = result[f"recall@{RETRIEVAL_K}"] if RETRIEVAL_K in k_values else result[f"recall@{k_values[-1]}"]
+    result["recall_per_ms"] = round(quality / max(p50_ms, 1e-6), 2)
+    result["recall_per_1k_vectors"] = round(quality / max(len(chunks) / 1000, 1e-6), 2)
+    return result
+
+
+def run_evaluation(queries, source=TEST_BANK_PATH, strategies=CHUNK_STRATEGIES, k_values=K_VALUES, repeat=5,
+                   chunk_size=CHUNK_SIZE, max_tokens=CHUNK_MAX_TOKENS):
+    """Evaluate every strategy against the same labelled queries; returns a list of result dicts"""
+    queries = labelled_in(queries, source)
+    # The model itself, so timings are real embedding work and the eval chunks stay out of the shared cache
+    embeddings = get_embedding_model()
+    query_vectors = _normalize([embeddings.embed_query(query["query"]) for query in queries])
+    print(f"{len(queries)} labelled queries")
+    results = []
+    for strategy in strategies:
+        result = evaluate(strategy, queries, query_vectors, embeddings, source, k_values, repeat, chunk_size,
+                          max_tokens)
+        results.append(result)
+        print(f"{strategy:<12} {result['vectors']:>8} vectors  "
+              + "  ".join(f"R@{k} {result[f'recall@{k}']:.3f}" for k in k_values)
+              + f"  P@{k_values[0]} {result[f'precision@{k_values[0]}']:.3f}  MRR {result['mrr']:.3f}"
+              + f"  p50 {result['p50_ms']:.3f} ms  p95 {result['p95_ms']:.3f} ms")
+    return results
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare test bank chunking strategies on recall@k and search latency.",
+    )
+    parser.add_argument("--source", default=TEST_BANK_PATH, help="Test bank store, CSV or Excel file")
+    parser.add_argument("--strategies", nargs="+", choices=CHUNK_STRATEGIES, default=list(CHUNK_STRATEGIES))
+    parser.add_argument("--queries", default=QUERIES_PATH,
+                        help="JSONL labelled queries, worded independently of the bank (default: the test.csv set)")
+    parser.add_argument("--k", type=positive_int, nargs="+", default=K_VALUES, help="Cut-offs for recall and precision")
+    parser.add_argument("--repeat", type=positive_int, default=5, help="Timed passes over the queries")
+    parser.add_argument("--chunk-size", type=positive_int, default=CHUNK_SIZE, help="Rows per chunk (fixed strategy)")
+    parser.add_argument("--max-tokens", type=positive_int, default=CHUNK_MAX_TOKENS,
+                        help="Token limit per chunk (requirement and tokens strategies)")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    k_values = sorted(set(args.k))
+    results = run_evaluation(load_queries(args.queries), args.source, args.strategies, k_values, args.repeat,
+                             args.chunk_size, args.max_tokens)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "queries": args.queries, "k": k_values,
+                       "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+# retriever.py
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+import tracing
+from bank_metadata import METADATA_COLUMNS, where_mask
+from config import (
+    INGEST_MANIFEST_PATH, RETRIEVAL_CANDIDATES, RETRIEVAL_QUERY_CHARS, RETRIEVAL_BUDGET_MS,
+    MMR_LAMBDA, RERANK_CANDIDATES,
+)
+
+TOKEN = re.compile(r"[a-z0-9]+")
+RRF_K = 60  # Reciprocal rank fusion damping; 60 is the usual choice
+LOAD_PAGE_SIZE = 5000
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    """In-process inverted index over the test bank chunks, scored with Okapi BM25.
+
+    Postings are kept as numpy arrays per term, and the filterable metadata
+    fields as integer codes per chunk, so a query touches only the postings
+    of its own terms.
+    """
+
+    def __init__(self, ids, texts, metadatas, k1=1.5, b=0.75):
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.k1 = k1
+        self.b = b
+        count = len(self.ids)
+        postings = {}
+        lengths = np.zeros(count, dtype=np.float32)
+        for position, text in enumerate(self.texts):
+            terms = Counter(tokenize(text))
+            lengths[position] = sum(terms.values())
+            for term, frequency in terms.items():
+                docs, frequencies = postings.setdefault(term, ([], []))
+                docs.append(position)
+                frequencies.append(frequency)
+        self.lengths = lengths
+        self.average_length = float(lengths.mean()) if count else 0.0
+        self.postings = {
+            term: (np.array(docs, dtype=np.int32), np.array(frequencies, dtype=np.float32))
+            for term, (docs, frequencies) in postings.items()
+        }
+        self.idf = {
+            term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, (docs, _) in self.postings.items()
+        }
+        self.fields = {}
+        for field in METADATA_COLUMNS:
+            values = pd.Series([(metadata or {}).get(field, "") for metadata in metadatas], dtype=object)
+            codes, uniques = pd.factorize(values)
+            self.fields[field] = (codes, {value: code for code, value in enumerate(uniques)})
+
+    @classmethod
+    def from_vector_db(cls, vector_db):
+        """Build the index from every chunk stored in the vector store"""
+        ids, texts, metadatas = [], [], []
+        offset = 0
+        while True:
+            page = vector_db.get(include=["documents", "metadatas"], limit=LOAD_PAGE_SIZE, offset=offset)
+            ids.extend(page["ids"])
+            texts.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+            if len(page["ids"]) < LOAD_PAGE_SIZE:
+                break
+            offset += LOAD_PAGE_SIZE
+        return cls(ids, texts, metadatas)
+
+    def mask(self, where):
+        """Boolean mask of the chunks matching a Chroma-style `where` clause (None matches all)"""
+        return where_mask(where, self.fields, len(self.ids))
+
+    def search(self, query, k, where=None):
+        """Positions and scores of the top `k` chunks for a query, best first"""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            docs, frequencies = posting
+            norm = frequencies + self.k1 * (1 - self.b + self.b * self.lengths[docs] / self.average_length)
+            scores[docs] += self.idf[term] * frequencies * (self.k1 + 1) / norm
+        mask = self.mask(where)
+        if mask is not None:
+            scores[~mask] = 0
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(position), float(scores[position])) for position in top]
+
+
+def mmr(embeddings, relevance, k, mmr_lambda=MMR_LAMBDA):
+    """Maximal marginal relevance: indices of `k` items balancing relevance against redundancy"""
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    relevance = np.asarray(relevance, dtype=np.float32)
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of each candidate to anything already selected
+    redundancy = vectors @ vectors[selected[0]]
+    while len(selected) < min(k, len(vectors)):
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+    return selected
+
+
+class HybridRetriever:
+    """BM25 and dense candidates fused with reciprocal rank fusion, optionally
+    reranked by a cross-encoder, then diversified with MMR.
+
+    The BM25 index is built from the vector store on first use and rebuilt
+    when the ingestion manifest changes. The cross-encoder only runs while
+    the request is still inside the latency budget.
+    """
+
+    def __init__(self, vector_db, embeddings, reranker=None, candidates=RETRIEVAL_CANDIDATES,
+                 rerank_candidates=RERANK_CANDIDATES, query_chars=RETRIEVAL_QUERY_CHARS,
+                 budget_ms=RETRIEVAL_BUDGET_MS, mmr_lambda=MMR_LAMBDA, manifest_path=INGEST_MANIFEST_PATH):
+        self.vector_db = vector_db
+        self.embeddings = embeddings
+        self.reranker = reranker
+        self.candidates = candidates
+        self.rerank_candidates = rerank_candidates
+        self.query_chars = query_chars
+        self.budget = budget_ms / 1000
+        self.mmr_lambda = mmr_lambda
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+        self._bm25 = None
+        self._bm25_version = None
+        self._last_rerank = 0.0
+
+    def _manifest_version(self):
+        if self.manifest_path and os.path.exists(self.manifest_path):
+            return os.path.getmtime(self.manifest_path)
+        return None
+
+    def bm25(self):
+        """The BM25 index, rebuilt if the test bank was re-ingested since it was built"""
+        version = self._manifest_version()
+        if self._bm25 is None or version != self._bm25_version:
+            with self._lock:
+                if self._bm25 is None or version != self._bm25_version:
+                    with tracing.span("bm25_build") as current:
+                        self._bm25 = BM25Index.from_vector_db(self.vector_db)
+                        current.set(chunks=len(self._bm25.ids))
+                    self._bm25_version = version
+        return self._bm25
+
+    def _candidates(self, query, query_vector, where):
+        """{id: candidate} from both retrievers under one filter, with fused scores"""
+        found = {}
+        with tracing.span("dense_search"):
+            dense = self.vector_db._collection.query(
+                query_embeddings=[query_vector], n_results=self.candidates, where=where,
+                include=["documents", "embeddings"],
+            )
+        for rank, (chunk_id, text, embedding) in enumerate(
+            zip(dense["ids"][0], dense["documents"][0], dense["embeddings"][0])
+        ):
+            found[chunk_id] = {"text": text, "embedding": embedding, "score": 1 / (RRF_K + rank + 1)}
+
+        with tracing.span("bm25_search"):
+            bm25 = self.bm25()
+            lexical = bm25.search(query, self.candidates, where)
+        for rank, (position, _) in enumerate(lexical):
+            candidate = found.setdefault(bm25.ids[position],
+                                         {"text": bm25.texts[position], "embedding": None, "score": 0.0})
+            candidate["score"] += 1 / (RRF_K + rank + 1)
+        return found
+
+    def retrieve(self, query, k, cascade=(None,)):
+        """Texts of `k` diverse, relevant chunks, trying each filter of `cascade` until enough are found"""
+        start = time.perf_counter()
+        with tracing.span("embed_query") as current:
+            # The embedding model truncates long input anyway; embedding less is faster
+            dense_query = query[:self.query_chars]
+            query_vector = self.embeddings.embed_query(dense_query)
+            current.set(chars=len(dense_query))
+
+        candidates = {}
+        for level, where in enumerate(cascade):
+            for chunk_id, candidate in self._candidates(query, query_vector, where).items():
+                if chunk_id not in candidates:
+                    # Anything matching a stricter filter outranks what a relaxed one adds
+                    candidate["score"] -= level
+                    candidates[chunk_id] = candidate
+            if len(candidates) >= k or time.perf_counter() - start > self.budget:
+                break
+        if not candidates:
+            return []
+
+        ids = sorted(candidates, key=lambda chunk_id: -candidates[chunk_id]["score"])
+        missing = [chunk_id for chunk_id in ids if candidates[chunk_id]["embedding"] is None]
+        if missing:
+            stored = self.vector_db._collection.get(ids=missing, include=["embeddings"])
+            for chunk_id, embedding in zip(stored["ids"], stored["embeddings"]):
+                candidates[chunk_id]["embedding"] = embedding
+        ids = [chunk_id for chunk_id in ids if candidates[chunk_id]["embedding"] is not None]
+
+        elapsed = time.perf_counter() - start
+        if self.reranker is not None and elapsed + self._last_rerank <= self.budget:
+            with tracing.span("rerank") as current:
+                rerank_start = time.perf_counter()
+                top = ids[:self.rerank_candidates]
+                scores = self.reranker.predict([(dense_query, candidates[chunk_id]["text"]) for chunk_id in top])
+                order = [top[index] for index in np.argsort(-np.asarray(scores))]
+                for rank, chunk_id in enumerate(order):
+                    candidates[chunk_id]["score"] = 1 / (RRF_K + rank + 1)
+                ids = order + ids[self.rerank_candidates:]
+                self._last_rerank = time.perf_counter() - rerank_start
+                current.set(candidates=len(top))
+        elif self.reranker is not None:
+            tracing.add(rerank_skipped=1)
+
+        with tracing.span("mmr", candidates=len(ids)):
+            relevance = np.array([candidates[chunk_id]["score"] for chunk_id in ids], dtype=np.float32)
+            # Rescale so relevance and similarity are on comparable scales
+            spread = relevance.max() - relevance.min()
+            relevance = (relevance - relevance.min()) / spread if spread else np.ones_like(relevance)
+            chosen = mmr([candidates[chunk_id]["embedding"] for chunk_id in ids], relevance, k, self.mmr_lambda)
+        return [candidates[ids[index]]["text"] for index in chosen]
@@ -0,0 +1,231 @@
+# test_bank.py
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from bank_metadata import METADATA_COLUMNS, row_metadata
+from config import INGEST_READ_SIZE
+from models import COLUMNS, cases_to_dataframe
+
+# Test bank column -> store column; anything else in an imported file is ignored
+BANK_COLUMNS = {**COLUMNS, "Line of Business": "line_of_business"}
+REQUIRED_COLUMNS = ["Test Case Description", "Execution Steps", "Expected Result"]
+# Normalized metadata field -> store column the retrieval filters run against
+FILTER_COLUMNS = {field: f"meta_{field}" for field in METADATA_COLUMNS}
+FILTER_COLUMNS["requirement_id"] = "requirement_id"
+STORE_SUFFIXES = (".sqlite3", ".sqlite", ".db")
+INSERT_BATCH_SIZE = 1000
+
+
+def is_store(path):
+    return str(path).lower().endswith(STORE_SUFFIXES)
+
+
+def validate_columns(columns, source="test bank"):
+    """Split a file's columns into those the bank knows and those it ignores; fails on missing required ones."""
+    known = [column for column in columns if column in BANK_COLUMNS]
+    missing = [column for column in REQUIRED_COLUMNS if column not in known]
+    if missing:
+        raise ValueError(f"{source} is missing required columns: {', '.join(missing)}")
+    return known, [column for column in columns if column not in BANK_COLUMNS]
+
+
+def clean_rows(rows, source="test bank"):
+    """Rows with only the known columns, every value as text, and the rows lacking all content dropped.
+
+    Adds a "Row Key" column: the Test Case ID, or Sl No. where there is none.
+    """
+    rows = rows.rename(columns=lambda column: " ".join(str(column).split()))
+    known, _ = validate_columns(list(rows.columns), source)
+    rows = rows[known].fillna("").astype(str)
+    for column in BANK_COLUMNS:
+        if column not in rows.columns:
+            rows[column] = ""
+    content = rows[REQUIRED_COLUMNS].apply(lambda values: values.str.strip()).ne("").any(axis=1)
+    rows = rows[content]
+    test_case_ids = rows["Test Case ID"]
+    return rows.assign(**{"Row Key": test_case_ids.where(test_case_ids.str.strip() != "", rows["Sl No."])})
+
+
+def read_bank_file(path, read_size=INGEST_READ_SIZE):
+    """Stream a CSV (or read an Excel) test bank as cleaned DataFrames of at most `read_size` rows."""
+    if str(path).lower().endswith((".xlsx", ".xls")):
+        frames = [pd.read_excel(path, dtype=str)]
+    else:
+        frames = pd.read_csv(path, chunksize=read_size, dtype=str, keep_default_na=False)
+    ignored = None
+    for frame in frames:
+        if ignored is None:
+            ignored = validate_columns([" ".join(str(c).split()) for c in frame.columns], path)[1]
+            if ignored:
+                print(f"Ignoring columns of {path} outside the test bank schema: {', '.join(ignored)}")
+        for start in range(0, len(frame), read_size):
+            yield clean_rows(frame.iloc[start:start + read_size], path)
+
+
+def read_bank(source, read_size=INGEST_READ_SIZE):
+    """Cleaned DataFrames from a test bank store or file, in row order"""
+    if is_store(source):
+        bank = TestBank(source)
+        try:
+            yield from bank.scan(read_size=read_size)
+        finally:
+            bank.close()
+    else:
+        yield from read_bank_file(source, read_size)
+
+
+def where_sql(where):
+    """SQL condition and parameters for a Chroma-style `where` clause (None matches every row)"""
+    if where is None:
+        return "1", []
+    if "$and" in where:
+        parts = [where_sql(condition) for condition in where["$and"]]
+        return " AND ".join(f"({sql})" for sql, _ in parts), [param for _, params in parts for param in params]
+    (field, value), = where.items()
+    if field not in FILTER_COLUMNS:
+        raise ValueError(f"Cannot filter the test bank on {field!r}")
+    return f"{FILTER_COLUMNS[field]} = ?", [value]
+
+
+class TestBank:
+    """The canonical test bank, kept in SQLite with the filterable fields indexed.
+
+    Rows keep their original column values alongside the normalized metadata
+    fields retrieval filters on (meta_insurance_type, meta_region, ...), so
+    filtered scans and counts are index lookups rather than CSV parses. Every
+    row records the file it was imported from, or the origin of appended
+    generated cases, so re-importing a file replaces just its own rows.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = ",\n".join(f"{column} TEXT NOT NULL DEFAULT ''"
+                             for column in dict.fromkeys([*BANK_COLUMNS.values(), *FILTER_COLUMNS.values()]))
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS test_cases (
+                id INTEGER PRIMARY KEY,
+                row_key TEXT NOT NULL,
+                source TEXT NOT NULL,
+                added_at REAL NOT NULL,
+                {columns}
+            )
+        """)
+        for column in ["source", *dict.fromkeys(FILTER_COLUMNS.values())]:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{column} ON test_cases ({column})")
+        self._conn.commit()
+
+    def _insert(self, rows, source):
+        """Insert cleaned rows; the caller holds the lock and commits."""
+        metadata = row_metadata(rows)
+        store_columns = ["row_key", "source", "added_at", *BANK_COLUMNS.values(),
+                         *(FILTER_COLUMNS[field] for field in metadata.columns)]
+        values = [rows["Row Key"], [source] * len(rows), [time.time()] * len(rows),
+                  *(rows[column] for column in BANK_COLUMNS), *(metadata[field] for field in metadata.columns)]
+        records = list(zip(*values))
+        sql = (f"INSERT INTO test_cases ({', '.join(store_columns)}) "
+               f"VALUES ({', '.join('?' * len(store_columns))})")
+        for start in range(0, len(records), INSERT_BATCH_SIZE):
+            self._conn.executemany(sql, records[start:start + INSERT_BATCH_SIZE])
+        return len(records)
+
+    def _commit(self):
+        # Rows without a Sl No. (or any key) are numbered by their position in the store
+        self._conn.execute("UPDATE test_cases SET sl_no = CAST(id AS TEXT) WHERE sl_no = ''")
+        self._conn.execute("UPDATE test_cases SET row_key = sl_no WHERE row_key = ''")
+        self._conn.commit()
+
+    def import_file(self, path, replace=True, read_size=INGEST_READ_SIZE):
+        """Load a CSV or Excel test bank, replacing the rows an earlier import of `path` added.
+
+        Returns the number of rows stored; the import is one transaction.
+        """
+        source = os.path.basename(path)
+        imported = 0
+        with self._lock:
+            try:
+                if replace:
+                    self._conn.execute("DELETE FROM test_cases WHERE source = ?", (source,))
+                for rows in read_bank_file(path, read_size):
+                    imported += self._insert(rows, source)
+                self._commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return imported
+
+    def append_cases(self, test_cases, insurance_type="", region="", line_of_business="", source="generated"):
+        """Add accepted generated cases, each under a fresh row key so they never collide with bank IDs.
+
+        LOB always holds the insurance type they were generated for (the
+        generated LOB column is the line of business), so retrieval filters
+        find them; `region` fills in a blank Region.
+        """
+        if not test_cases:
+            return 0
+        rows = cases_to_dataframe(test_cases)
+        rows["Sl No."] = ""
+        rows["LOB"] = insurance_type or ""
+        rows["Region"] = rows["Region"].where(rows["Region"].str.strip() != "", region or "")
+        rows["Line of Business"] = line_of_business or ""
+        rows = clean_rows(rows, source)
+        rows["Row Key"] = [f"{source}-{uuid.uuid4().hex[:12]}" for _ in range(len(rows))]
+        with self._lock:
+            added = self._insert(rows, source)
+            self._commit()
+        return added
+
+    def _select(self, where, columns):
+        condition, params = where_sql(where)
+        return f"SELECT {', '.join(columns)} FROM test_cases WHERE {condition}", params
+
+    def scan(self, where=None, read_size=INGEST_READ_SIZE):
+        """Matching rows in store order, as DataFrames of at most `read_size` rows with the bank's column names"""
+        names = ["Row Key", *BANK_COLUMNS]
+        condition, params = where_sql(where)
+        last_id = 0
+        while True:
+            with self._lock:
+                records = self._conn.execute(
+                    f"SELECT id, row_key, {', '.join(BANK_COLUMNS.values())} FROM test_cases "
+                    f"WHERE id > ? AND ({condition}) ORDER BY id LIMIT ?",
+                    [last_id, *params, read_size],
+                ).fetchall()
+            if not records:
+                return
+            last_id = records[-1][0]
+            yield pd.DataFrame([record[1:] for record in records], columns=names)
+            if len(records) < read_size:
+                return
+
+    def read(self, where=None):
+        """Every matching row as one DataFrame"""
+        frames = list(self.scan(where))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["Row Key", *BANK_COLUMNS])
+
+    def count(self, where=None):
+        sql, params = self._select(where, ["COUNT(*)"])
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def summary(self, by=("insurance_type", "module"), where=None):
+        """Row counts per combination of the `by` fields, largest first"""
+        columns = [FILTER_COLUMNS[field] for field in by]
+        sql, params = self._select(where, [*columns, "COUNT(*)"])
+        with self._lock:
+            records = self._conn.execute(
+                f"{sql} GROUP BY {', '.join(columns)} ORDER BY COUNT(*) DESC", params
+            ).fetchall()
+        return pd.DataFrame(records, columns=[*by, "cases"])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
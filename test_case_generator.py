@@ -1,37 +1,47 @@
 # test_case_generator.py
-from groq import Groq
-from config import GROQ_API_KEY
-from database import initialize_vector_db
-from response_parser import clean_ai_response
+from bank_metadata import filter_cascade, indexed_fields
+from config import RETRIEVAL_K, RETRIEVAL_MODE
+from dedup import drop_duplicates, new_dedup_index, shortfall
+from models import renumber
+from prompt_budget import (
+    allocate, compress_requirements, count_tokens, fit_examples, input_budget, output_budget, split_examples,
+)
+from resources import get_llm_backend, get_response_cache, get_retriever, get_vector_db
+from response_parser import parse_response, format_diagnostic, IncrementalParser
 import streamlit as st
+import tracing
 
-groq_client = Groq(api_key=GROQ_API_KEY)
-vector_db = initialize_vector_db()
-
-def generate_test_cases(insurance_type, region, line_of_business, user_requirements, num_test_cases):
-    """Generate test cases with variable execution steps"""
+def retrieve_context(insurance_type, region, line_of_business, user_requirements):
+    """Retrieve similar test bank cases to use as examples in the prompt"""
     query = f"{insurance_type} {region} {line_of_business} {user_requirements}"
+    # Search within the selected insurance type and region first, relaxing
+    # the filter only when too few matching examples exist
+    cascade = filter_cascade(insurance_type, region, line_of_business, indexed_fields())
     
-    # Print the query used for similarity search
-    print(f"Query for similarity search: {query}")
-    
-    # Perform similarity search
-    similar_cases = vector_db.similarity_search(query, k=4)
-    
-    # Print the similar cases retrieved
-    print("Similar cases retrieved from vector database:")
-    for i, case in enumerate(similar_cases, 1):
-        print(f"Case {i}:\n{case.page_content}\n{'-' * 50}")
-    
-    # Construct context from similar cases
-    context = "\n".join([case.page_content for case in similar_cases])
-    
-    # Print the context used for generating new test cases
-    print("Context constructed from similar cases:")
-    print(context)
-    
-    # Construct the prompt
-    prompt = f"""As an Insurance QA Expert, create {num_test_cases} test cases. Generated test cases should be based on the specific line of business and region. Please make sure the generated test cases are very high in quality and detail with this structure:
+    with tracing.span("retrieval", k=RETRIEVAL_K, mode=RETRIEVAL_MODE, query_chars=len(query)) as current:
+        if RETRIEVAL_MODE == "hybrid":
+            examples = get_retriever().retrieve(query, RETRIEVAL_K, cascade)
+        else:
+            examples = _dense_search(query, cascade)
+        
+        # Construct context from similar cases
+        context = "\n".join(examples)
+        current.set(results=len(examples), context_chars=len(context))
+    return context
+
+def _dense_search(query, cascade):
+    """Plain vector search, relaxing the filter until RETRIEVAL_K distinct examples are found"""
+    vector_db = get_vector_db()
+    examples = []
+    for where in cascade:
+        for case in vector_db.similarity_search(query, k=RETRIEVAL_K, filter=where):
+            if case.page_content not in examples and len(examples) < RETRIEVAL_K:
+                examples.append(case.page_content)
+        if len(examples) >= RETRIEVAL_K:
+            break
+    return examples
+
+PROMPT_TEMPLATE = """As an Insurance QA Expert, create {num_test_cases} test cases. Generated test cases should be based on the specific line of business and region. Please make sure the generated test cases are very high in quality and detail with this structure:
 
 **Test Case X: [Scenario]**
 
@@ -48,18 +58,161 @@ Step2: [Action]
 ... (Add as many steps as needed for the test case)
 Expected Result: [Measurable outcome]
 
-Avoid these examples but take inspiration from them only: {context}"""
-    
-    # Print the prompt sent to the Groq API
-    print("Prompt sent to Groq API:")
-    print(prompt)
+Requirements:
+{requirements}
+
+Avoid these examples but take inspiration from them only:
+{examples}"""
+
+def build_prompt(insurance_type, region, line_of_business, user_requirements, num_test_cases, context=None, focus=None):
+    """Build the generation prompt, retrieving examples unless a context is given.
+
+    The prompt is kept within the model's context window after reserving
+    room for the response: repeated examples are dropped, and requirements
+    and examples are trimmed to share what is left.
+    """
+    if context is None:
+        context = retrieve_context(insurance_type, region, line_of_business, user_requirements)
     
-    # Send the prompt to Groq API
-    response = groq_client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
-        model="llama3-70b-8192",
+    # Construct the prompt
+    with tracing.span("prompt_assembly") as current:
+        suffix = f"\n\n{focus}" if focus else ""
+        skeleton = PROMPT_TEMPLATE.format(num_test_cases=num_test_cases, line_of_business=line_of_business,
+                                          region=region, requirements="", examples="") + suffix
+        budget = input_budget(num_test_cases)
+        examples = split_examples(context)
+        requirement_tokens = count_tokens(user_requirements)
+        requirement_budget, example_budget = allocate(
+            budget - count_tokens(skeleton), requirement_tokens, sum(count_tokens(example) + 1 for example in examples),
+        )
+        requirements = compress_requirements(user_requirements, requirement_budget)
+        kept = fit_examples(examples, example_budget)
+        prompt = PROMPT_TEMPLATE.format(
+            num_test_cases=num_test_cases, line_of_business=line_of_business, region=region,
+            requirements=requirements,
+            examples="\n\n".join(f"Example {number}:\n{example}" for number, example in enumerate(kept, 1)),
+        ) + suffix
+        prompt_tokens = count_tokens(prompt)
+        current.set(prompt_tokens=prompt_tokens, output_reserved=output_budget(num_test_cases),
+                    requirement_tokens=requirement_tokens, requirements_kept=count_tokens(requirements),
+                    examples=len(kept), examples_dropped=len(examples) - len(kept),
+                    over_budget=prompt_tokens > budget)
+    return prompt
+
+def parse_traced(raw_content):
+    """parse_response, counted on the current trace"""
+    with tracing.span("parse") as current:
+        test_cases, diagnostics = parse_response(raw_content)
+        current.set(cases=len(test_cases), failed=len(diagnostics))
+    tracing.add(cases_parsed=len(test_cases), cases_failed=len(diagnostics))
+    return test_cases, diagnostics
+
+def _novel(test_cases, insurance_type, num_test_cases, diagnostics):
+    """Drop near-duplicates, closing the numbering gaps they leave; returns (test_cases, diagnostics).
+
+    The one-call paths do not regenerate, so a suite left short of
+    `num_test_cases` is reported in the diagnostics instead.
+    """
+    novel = drop_duplicates(test_cases, insurance_type)
+    dropped = len(test_cases) - len(novel)
+    return (renumber(novel) if dropped else novel,
+            diagnostics + shortfall(num_test_cases, len(novel), dropped))
+
+def generate_suite(insurance_type, region, line_of_business, user_requirements, num_test_cases):
+    """Generate test cases without any UI; returns (test_cases, raw_response, diagnostics)"""
+    with tracing.trace("generate_suite", insurance_type=insurance_type, region=region,
+                       line_of_business=line_of_business, num_test_cases=num_test_cases) as current:
+        response_cache = get_response_cache()
+        with tracing.span("cache_lookup") as lookup:
+            cached = response_cache.get(insurance_type, region, line_of_business, user_requirements, num_test_cases)
+            lookup.set(hit=cached is not None)
+        if cached is not None:
+            current.set(cached=True)
+            test_cases, diagnostics = parse_traced(cached)
+            test_cases, diagnostics = _novel(test_cases, insurance_type, num_test_cases, diagnostics)
+            return test_cases, cached, diagnostics
+
+        prompt = build_prompt(insurance_type, region, line_of_business, user_requirements, num_test_cases)
+        
+        # Send the prompt to the LLM backend
+        raw_content = get_llm_backend().complete(prompt)
+        test_cases, diagnostics = parse_traced(raw_content)
+        if test_cases:
+            # Only keep responses that actually produced test cases
+            response_cache.put(insurance_type, region, line_of_business, user_requirements, num_test_cases, raw_content)
+        test_cases, diagnostics = _novel(test_cases, insurance_type, num_test_cases, diagnostics)
+        return test_cases, raw_content, diagnostics
+
+def stream_suite(insurance_type, region, line_of_business, user_requirements, num_test_cases, on_complete=None):
+    """Stream the completion and yield each test case as soon as it is complete.
+
+    `on_complete(raw_response, diagnostics)` is called once the stream has ended.
+    """
+    with tracing.trace("stream_suite", insurance_type=insurance_type, region=region,
+                       line_of_business=line_of_business, num_test_cases=num_test_cases) as current:
+        response_cache = get_response_cache()
+        with tracing.span("cache_lookup") as lookup:
+            cached = response_cache.get(insurance_type, region, line_of_business, user_requirements, num_test_cases)
+            lookup.set(hit=cached is not None)
+        dedup = new_dedup_index(insurance_type)
+        produced = 0
+        dropped = 0
+
+        def novel(cases):
+            # Cases are checked one by one as they complete, so streaming is not held up
+            nonlocal produced, dropped
+            for case in cases:
+                produced += 1
+                if dedup is not None and not dedup.add([case])[0]:
+                    dropped += 1
+                    continue
+                if dropped:
+                    case.sl_no, case.test_case_id = str(produced - dropped), f"TC-{produced - dropped:03d}"
+                yield case
+
+        if cached is not None:
+            current.set(cached=True)
+            test_cases, diagnostics = parse_traced(cached)
+            # Cached cases go through the same dedup as streamed ones, so both give the same suite
+            yield from novel(test_cases)
+            if on_complete:
+                on_complete(cached, diagnostics + shortfall(num_test_cases, produced - dropped, dropped))
+            return
+
+        prompt = build_prompt(insurance_type, region, line_of_business, user_requirements, num_test_cases)
+        parser = IncrementalParser()
+        raw_parts = []
+
+        for delta in get_llm_backend().stream(prompt):
+            raw_parts.append(delta)
+            yield from novel(parser.feed(delta))
+        yield from novel(parser.finish())
+        tracing.add(cases_parsed=produced, cases_failed=len(parser.diagnostics))
+
+        raw_content = "".join(raw_parts)
+        if produced:
+            response_cache.put(insurance_type, region, line_of_business, user_requirements, num_test_cases, raw_content)
+        if on_complete:
+            # Nothing is regenerated here, so a short suite is reported rather than topped up
+            on_complete(raw_content, parser.diagnostics + shortfall(num_test_cases, produced - dropped, dropped))
+
+def show_generation_result(raw_content, diagnostics):
+    """Keep the raw response for the debug view and surface parse problems in the UI"""
+    st.session_state.raw_response = raw_content
+    for diagnostic in diagnostics:
+        st.warning(format_diagnostic(diagnostic))
+
+def generate_test_cases(insurance_type, region, line_of_business, user_requirements, num_test_cases):
+    """Generate test cases with variable execution steps"""
+    test_cases, raw_content, diagnostics = generate_suite(
+        insurance_type, region, line_of_business, user_requirements, num_test_cases
+    )
+    show_generation_result(raw_content, diagnostics)
+    return test_cases
+
+def generate_test_cases_stream(insurance_type, region, line_of_business, user_requirements, num_test_cases):
+    """Streamlit wrapper around stream_suite"""
+    yield from stream_suite(
+        insurance_type, region, line_of_business, user_requirements, num_test_cases,
+        on_complete=show_generation_result,
     )
-    
-    raw_content = response.choices[0].message.content
-    st.session_state.raw_response = raw_content  # Store for debugging
-    return clean_ai_response(raw_content)
\ No newline at end of file
@@ -0,0 +1,281 @@
+# tracing.py
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import TRACE_SINKS, TRACE_LOG_PATH, TRACE_RECENT
+
+# The active trace and span follow the code through threads' own contexts and
+# into asyncio tasks, so concurrent requests never see each other's spans.
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+_last_trace = threading.local()
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Span:
+    """One timed stage of a request, with free-form attributes."""
+
+    __slots__ = ("name", "parent", "offset", "duration", "attributes")
+
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.parent = parent
+        self.offset = 0.0
+        self.duration = None
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {"name": self.name, "parent": self.parent, "offset": round(self.offset, 6),
+                "duration": None if self.duration is None else round(self.duration, 6), **self.attributes}
+
+
+class Trace:
+    """Every span recorded while handling one request, plus request-level counters."""
+
+    def __init__(self, name, attributes):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.attributes = attributes
+        self.counters = {}
+        self.spans = []
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, **counters):
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def to_dict(self):
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration": None if self.duration is None else round(self.duration, 6),
+            **self.attributes,
+            **self.counters,
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+@contextlib.contextmanager
+def trace(name, **attributes):
+    """Trace one request; inside an active trace this is just a span.
+
+    The finished trace is handed to every configured sink.
+    """
+    if _current_trace.get() is not None:
+        with span(name, **attributes) as current:
+            yield current
+        return
+
+    current = Trace(name, attributes)
+    token = _current_trace.set(current)
+    try:
+        yield current
+        current.set(status="ok")
+    except GeneratorExit:
+        # A streamed request the caller stopped reading
+        current.set(status="cancelled")
+        raise
+    except BaseException as e:
+        current.set(status="error", error=str(e))
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _current_trace.reset(token)
+        _last_trace.value = current
+        _emit(current)
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Time a stage of the current request; a no-op recorder when nothing is being traced."""
+    current_trace = _current_trace.get()
+    parent = _current_span.get()
+    current = Span(name, parent.name if parent else None, attributes)
+    if current_trace is None:
+        yield current
+        return
+
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    current.offset = start - current_trace.start
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=str(e))
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        _current_span.reset(token)
+        current_trace.spans.append(current)
+
+
+def current_span():
+    """The innermost open span of the current request, or None outside a trace"""
+    return _current_span.get()
+
+
+def add(**counters):
+    """Add to request-level counters (tokens, parsed cases, ...) of the current trace."""
+    current_trace = _current_trace.get()
+    if current_trace is not None:
+        current_trace.add(**counters)
+
+
+def last_trace():
+    """The most recent trace finished on this thread"""
+    return getattr(_last_trace, "value", None)
+
+
+class JsonLogSink:
+    """Writes each finished trace as one JSON line to a file, or stderr for "-"."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != "-":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def emit(self, finished):
+        line = json.dumps(finished.to_dict(), default=str) + "\n"
+        with self._lock:
+            if self.path == "-":
+                sys.stderr.write(line)
+            else:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+
+
+class PrometheusSink:
+    """Aggregates traces into latency histograms and counters in Prometheus text format."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def _observe(self, labels, seconds):
+        histogram = self._histograms.setdefault(labels, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+        for index, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                histogram["counts"][index] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+    def _count(self, name, labels, value):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def emit(self, finished):
+        with self._lock:
+            self._observe((finished.name, "total"), finished.duration)
+            for finished_span in finished.spans:
+                if finished_span.duration is not None:
+                    self._observe((finished.name, finished_span.name), finished_span.duration)
+            self._count("testgen_requests_total", (("request", finished.name),
+                                                   ("status", finished.attributes.get("status", "ok"))), 1)
+            for key, value in finished.counters.items():
+                self._count(f"testgen_{key}_total", (("request", finished.name),), value)
+
+    def render(self):
+        """Current metrics in the Prometheus text exposition format"""
+        lines = ["# TYPE testgen_stage_seconds histogram"]
+        with self._lock:
+            for (request, stage), histogram in sorted(self._histograms.items()):
+                labels = f'request="{request}",stage="{stage}"'
+                for bound, count in zip(self.buckets, histogram["counts"]):
+                    lines.append(f'testgen_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'testgen_stage_seconds_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+                lines.append(f"testgen_stage_seconds_sum{{{labels}}} {histogram['sum']:.6f}")
+                lines.append(f"testgen_stage_seconds_count{{{labels}}} {histogram['count']}")
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f"{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class RecentTraces:
+    """Keeps the last few traces in memory for the in-app panel."""
+
+    def __init__(self, size):
+        self.traces = deque(maxlen=size)
+
+    def emit(self, finished):
+        self.traces.append(finished)
+
+    def get(self, trace_id):
+        return next((finished for finished in self.traces if finished.id == trace_id), None)
+
+
+recent = RecentTraces(TRACE_RECENT)
+prometheus = PrometheusSink() if "prometheus" in TRACE_SINKS else None
+_sinks = [recent]
+if prometheus:
+    _sinks.append(prometheus)
+if "json" in TRACE_SINKS:
+    _sinks.append(JsonLogSink(TRACE_LOG_PATH))
+
+
+def add_sink(sink):
+    """Send finished traces to another sink (anything with an emit(trace) method)"""
+    _sinks.append(sink)
+
+
+def _emit(finished):
+    for sink in _sinks:
+        try:
+            sink.emit(finished)
+        except Exception as e:
+            # Tracing must never break a request
+            print(f"Trace sink {type(sink).__name__} failed: {e}")
+
+
+_metrics_server = None
+_metrics_lock = threading.Lock()
+
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serve the Prometheus metrics over HTTP on a background thread; safe to call on every Streamlit rerun"""
+    global _metrics_server
+    with _metrics_lock:
+        if _metrics_server is not None or prometheus is None:
+            return
+        _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = prometheus.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
@@ -0,0 +1,336 @@
+# vector_index.py
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from bank_metadata import METADATA_COLUMNS, where_mask
+from config import VECTOR_INDEX_DTYPE, VECTOR_INDEX_NLIST, VECTOR_INDEX_NPROBE
+
+EXPORT_PAGE_SIZE = 5000
+SEARCH_BLOCK_ROWS = 65_536  # Rows dequantized and scored at a time
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 256  # Training rows per IVF list
+
+
+class IndexedDocument:
+    """A search hit, shaped like the LangChain Document that Chroma returns."""
+
+    __slots__ = ("id", "page_content", "metadata")
+
+    def __init__(self, id, page_content, metadata):
+        self.id = id
+        self.page_content = page_content
+        self.metadata = metadata
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / (np.linalg.norm(vectors, axis=-1, keepdims=True) + 1e-12)
+
+
+def quantize(vectors, dtype):
+    """Stored form of normalized vectors: (values, per-row scales for int8 or None)"""
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return vectors.astype(np.float16), None
+
+
+def dequantize(vectors, scales, rows):
+    """Float32 vectors of a slice or array of positions"""
+    block = np.asarray(vectors[rows], dtype=np.float32)
+    if scales is not None:
+        block *= np.asarray(scales[rows])[:, None]
+    return block
+
+
+def kmeans(vectors, nlist, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means centroids of normalized vectors"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        # An emptied list keeps its old centroid
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def build_vector_index(vector_db, path, dtype=VECTOR_INDEX_DTYPE, nlist=VECTOR_INDEX_NLIST):
+    """Export every chunk of a Chroma store into the read-only memory-mapped format; returns the chunk count.
+
+    The index is a directory of NumPy arrays (quantized vectors, metadata
+    codes, optional IVF lists) plus a JSON-lines document file with an
+    offsets array for random access. Each build is written to a new
+    versioned directory next to `path`, and `path` is a symlink that is
+    repointed with a single rename, so readers only ever see a complete
+    index.
+    """
+    collection = vector_db._collection
+    count = collection.count()
+    building = f"{path}.v{time.time_ns()}"
+    os.makedirs(building)
+
+    fields = list(METADATA_COLUMNS)
+    values = {field: {} for field in fields}
+    codes = np.lib.format.open_memmap(os.path.join(building, "codes.npy"), "w+", np.int32, (count, len(fields)))
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    ids = []
+    vectors = scales = None
+    with open(os.path.join(building, "documents.jsonl"), "wb") as documents:
+        for start in range(0, count, EXPORT_PAGE_SIZE):
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=EXPORT_PAGE_SIZE,
+                                  offset=start)
+            stop = start + len(page["ids"])
+            embedded = _normalize(page["embeddings"])
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(os.path.join(building, "vectors.npy"), "w+",
+                                                    np.int8 if dtype == "int8" else np.float16,
+                                                    (count, embedded.shape[1]))
+                if dtype == "int8":
+                    scales = np.lib.format.open_memmap(os.path.join(building, "scales.npy"), "w+", np.float32,
+                                                       (count,))
+            vectors[start:stop], page_scales = quantize(embedded, dtype)
+            if scales is not None:
+                scales[start:stop] = page_scales
+            for position, (chunk_id, text, metadata) in enumerate(
+                zip(page["ids"], page["documents"], page["metadatas"]), start
+            ):
+                metadata = metadata or {}
+                for column, field in enumerate(fields):
+                    value = metadata.get(field)
+                    codes[position, column] = values[field].setdefault(value, len(values[field])) if value else -1
+                record = json.dumps({"id": chunk_id, "text": text, "metadata": metadata}, ensure_ascii=False)
+                documents.write(record.encode() + b"\n")
+                offsets[position + 1] = documents.tell()
+            ids.extend(page["ids"])
+            if len(page["ids"]) < EXPORT_PAGE_SIZE:
+                break
+    np.save(os.path.join(building, "offsets.npy"), offsets)
+    with open(os.path.join(building, "ids.json"), "w") as f:
+        json.dump(ids, f)
+
+    nlist = min(nlist, count)
+    if nlist and vectors is not None:
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(count, min(count, nlist * KMEANS_SAMPLE_PER_LIST), replace=False))
+        centroids = kmeans(_normalize(dequantize(vectors, scales, sample)), nlist)
+        assignment = np.concatenate([
+            np.argmax(dequantize(vectors, scales, slice(start, start + SEARCH_BLOCK_ROWS)) @ centroids.T, axis=1)
+            for start in range(0, count, SEARCH_BLOCK_ROWS)
+        ])
+        np.save(os.path.join(building, "centroids.npy"), centroids)
+        np.save(os.path.join(building, "lists.npy"), np.argsort(assignment, kind="stable").astype(np.int64))
+        np.save(os.path.join(building, "list_offsets.npy"),
+                np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))]).astype(np.int64))
+    del vectors, scales, codes
+
+    with open(os.path.join(building, "index.json"), "w") as f:
+        json.dump({"count": len(ids), "dtype": dtype, "nlist": nlist,
+                   "fields": {field: list(values[field]) for field in fields}}, f)
+    _swap_in(path, building)
+    return len(ids)
+
+
+def _swap_in(path, version):
+    """Point the `path` symlink at a finished version directory and drop all but the previous version."""
+    previous = os.path.realpath(path) if os.path.islink(path) else None
+    if os.path.isdir(path) and not os.path.islink(path):
+        # An index from before versioned builds; moved aside once
+        os.rename(path, f"{path}.v0")
+        previous = f"{path}.v0"
+    link = f"{path}.link"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(version), link)
+    os.replace(link, path)
+    # The previous version stays for readers still loading it; processes mapping older files keep them open
+    keep = {os.path.realpath(version), previous}
+    prefix = os.path.basename(path) + ".v"
+    parent = os.path.dirname(os.path.abspath(path))
+    for name in os.listdir(parent):
+        candidate = os.path.join(parent, name)
+        if name.startswith(prefix) and os.path.realpath(candidate) not in keep:
+            shutil.rmtree(candidate, ignore_errors=True)
+
+
+class _IndexState:
+    """One opened version of an index; replaced as a whole when the index is rebuilt."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "index.json")) as f:
+            info = json.load(f)
+
+        def array(name):
+            file_path = os.path.join(directory, name)
+            return np.load(file_path, mmap_mode="r") if os.path.exists(file_path) else None
+
+        self.size = info["count"]
+        self.vectors = array("vectors.npy")
+        self.scales = array("scales.npy")
+        codes = array("codes.npy")
+        self.fields = {
+            field: (codes[:, column], {value: code for code, value in enumerate(values)})
+            for column, (field, values) in enumerate(info["fields"].items())
+        }
+        self.offsets = array("offsets.npy")
+        self.centroids = array("centroids.npy")
+        self.lists = array("lists.npy")
+        self.list_offsets = array("list_offsets.npy")
+        with open(os.path.join(directory, "documents.jsonl"), "rb") as f:
+            self.documents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self._ids = None
+
+    def record(self, position):
+        return json.loads(self.documents[self.offsets[position]:self.offsets[position + 1]])
+
+    def dequantize(self, rows):
+        return dequantize(self.vectors, self.scales, rows)
+
+    def position_of(self, chunk_id):
+        if self._ids is None:
+            with open(os.path.join(self.directory, "ids.json")) as f:
+                self._ids = {chunk_id: position for position, chunk_id in enumerate(json.load(f))}
+        return self._ids.get(chunk_id)
+
+
+class MmapVectorStore:
+    """Read-only vector store over an index written by build_vector_index.
+
+    Offers the parts of the Chroma / LangChain interface the app uses
+    (similarity_search, get, and _collection.query/get/count), so it can
+    stand in for Chroma. Arrays are memory-mapped, so opening the index is
+    nearly free and worker processes share one copy in the page cache.
+    Search is vectorized brute force, or IVF over the `nprobe` nearest lists
+    when the index was built with lists. A rebuilt index is opened as a new
+    state that replaces the old one in one assignment, so searches already
+    running finish on the version they started with.
+    """
+
+    def __init__(self, path, embedding_function=None, nprobe=VECTOR_INDEX_NPROBE):
+        self.path = path
+        self.embedding_function = embedding_function
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._state = None
+        self._refresh()
+
+    @property
+    def _collection(self):
+        # Code written against Chroma reaches the collection through this attribute
+        return self
+
+    def _refresh(self):
+        """The current index state, reopened if the index was rebuilt since it was opened"""
+        state = self._state
+        directory = os.path.realpath(self.path)
+        if state is None or state.directory != directory:
+            with self._lock:
+                state = self._state
+                if state is None or state.directory != directory:
+                    state = _IndexState(directory)
+                    self._state = state
+        return state
+
+    @staticmethod
+    def _top(positions, scores, k):
+        k = min(k, len(scores))
+        if k == 0:
+            return positions[:0], scores[:0]
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return positions[top], scores[top]
+
+    def _search_all(self, state, queries, k, mask):
+        """Brute force: best (positions, scores) per query over every row matching `mask`"""
+        candidates = None if mask is None else np.flatnonzero(mask)
+        total = state.size if candidates is None else len(candidates)
+        best = [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+        for start in range(0, total, SEARCH_BLOCK_ROWS):
+            if candidates is None:
+                positions = np.arange(start, min(start + SEARCH_BLOCK_ROWS, total))
+                block = state.dequantize(slice(positions[0], positions[-1] + 1))
+            else:
+                positions = candidates[start:start + SEARCH_BLOCK_ROWS]
+                block = state.dequantize(positions)
+            scores = block @ queries.T
+            for index, (kept_positions, kept_scores) in enumerate(best):
+                best[index] = self._top(np.concatenate([kept_positions, positions]),
+                                        np.concatenate([kept_scores, scores[:, index]]), k)
+        return best
+
+    def _search_lists(self, state, query, k, mask):
+        """IVF: best (positions, scores) within the lists nearest to the query"""
+        nearest = np.argsort(-(state.centroids @ query))[:self.nprobe]
+        positions = np.sort(np.concatenate([state.lists[state.list_offsets[c]:state.list_offsets[c + 1]]
+                                            for c in nearest]))
+        if mask is not None:
+            positions = positions[mask[positions]]
+            if len(positions) < k:
+                # A narrow filter can leave the probed lists short of matches
+                return self._search_all(state, query[None], k, mask)[0]
+        return self._top(positions, state.dequantize(positions) @ query, k)
+
+    def _search(self, state, query_embeddings, k, where):
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        mask = where_mask(where, state.fields, state.size)
+        if state.centroids is not None:
+            return [self._search_lists(state, query, k, mask) for query in queries]
+        return self._search_all(state, queries, k, mask)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("documents", "metadatas", "distances")):
+        """Chroma-style query: one list per query embedding under each key"""
+        state = self._refresh()
+        result = {"ids": [], "documents": [], "metadatas": [], "embeddings": [], "distances": []}
+        for positions, scores in self._search(state, query_embeddings, n_results, where):
+            records = [state.record(position) for position in positions]
+            result["ids"].append([record["id"] for record in records])
+            result["documents"].append([record["text"] for record in records])
+            result["metadatas"].append([record["metadata"] for record in records])
+            result["embeddings"].append(list(state.dequantize(positions)) if "embeddings" in include else None)
+            result["distances"].append((1 - scores).tolist())
+        return result
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        """Chroma-style get by IDs, or a page of every chunk"""
+        state = self._refresh()
+        if ids is not None:
+            positions = [position for position in map(state.position_of, ids) if position is not None]
+        else:
+            start = offset or 0
+            positions = range(start, state.size if limit is None else min(state.size, start + limit))
+        if where is not None:
+            mask = where_mask(where, state.fields, state.size)
+            positions = [position for position in positions if mask[position]]
+        records = [state.record(position) for position in positions]
+        result = {"ids": [record["id"] for record in records]}
+        if "documents" in include:
+            result["documents"] = [record["text"] for record in records]
+        if "metadatas" in include:
+            result["metadatas"] = [record["metadata"] for record in records]
+        if "embeddings" in include:
+            result["embeddings"] = list(state.dequantize(np.asarray(positions, dtype=np.int64)))
+        return result
+
+    def count(self):
+        return self._refresh().size
+
+    def similarity_search(self, query, k=4, filter=None):
+        """LangChain-style search: the `k` chunks closest to a query text"""
+        state = self._refresh()
+        [(positions, _)] = self._search(state, [self.embedding_function.embed_query(query)], k, filter)
+        documents = []
+        for position in positions:
+            record = state.record(position)
+            documents.append(IndexedDocument(record["id"], record["text"], record["metadata"]))
+        return documents